@@ -0,0 +1,52 @@
+from logging.config import fileConfig
+
+from sqlalchemy import create_engine
+from sqlalchemy import pool
+
+from alembic import context
+
+from database import SQLALCHEMY_DATABASE_URL
+import models
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+# Models' metadata, for `alembic revision --autogenerate`
+target_metadata = models.Base.metadata
+
+
+def run_migrations_offline() -> None:
+    """Emit the migration SQL to stdout instead of running it (`alembic upgrade head --sql`)."""
+    context.configure(
+        url=SQLALCHEMY_DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=SQLALCHEMY_DATABASE_URL.startswith("sqlite"),
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connectable = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=pool.NullPool)
+
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite can't ALTER constraints in place; batch mode rebuilds the table
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,138 @@
+"""baseline schema
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+Captures the schema that existed before Alembic (tables previously created via
+create_all / migrate_db.py). Tables that already exist are left untouched, so
+existing databases can simply run `alembic upgrade head`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001_baseline'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_table_if_missing(name, *columns):
+    if sa.inspect(op.get_bind()).has_table(name):
+        return False
+    op.create_table(name, *columns)
+    return True
+
+
+def _add_column_if_missing(table, column, index=None):
+    existing = {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+    if column.name in existing:
+        return
+    op.add_column(table, column)
+    if index:
+        op.create_index(index, table, [column.name])
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if _create_table_if_missing(
+        'users',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('supabase_id', sa.String(), nullable=True),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.Column('full_name', sa.String(), nullable=True),
+        sa.Column('hashed_password', sa.String(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('github_username', sa.String(), nullable=True),
+        sa.Column('total_xp', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    ):
+        op.create_index('ix_users_id', 'users', ['id'])
+        op.create_index('ix_users_supabase_id', 'users', ['supabase_id'], unique=True)
+        op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    else:
+        # Columns migrate_db.py used to add by hand
+        _add_column_if_missing('users', sa.Column('github_username', sa.String(), nullable=True))
+        _add_column_if_missing('users', sa.Column('total_xp', sa.Integer(), nullable=True, server_default='0'))
+
+    if _create_table_if_missing(
+        'roadmaps',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('content', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    ):
+        op.create_index('ix_roadmaps_id', 'roadmaps', ['id'])
+        op.create_index('ix_roadmaps_title', 'roadmaps', ['title'])
+
+    if _create_table_if_missing(
+        'topic_progress',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('roadmap_id', sa.Integer(), sa.ForeignKey('roadmaps.id'), nullable=True),
+        sa.Column('module_index', sa.Integer(), nullable=True),
+        sa.Column('topic_index', sa.Integer(), nullable=True),
+        sa.Column('is_completed', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    ):
+        op.create_index('ix_topic_progress_id', 'topic_progress', ['id'])
+
+    if _create_table_if_missing(
+        'lessons',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('topic', sa.String(), nullable=True),
+        sa.Column('context', sa.String(), nullable=True),
+        sa.Column('cache_key', sa.String(length=64), nullable=True),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('content_markdown', sa.Text(), nullable=True),
+        sa.Column('estimated_time', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    ):
+        op.create_index('ix_lessons_id', 'lessons', ['id'])
+        op.create_index('ix_lessons_topic', 'lessons', ['topic'])
+        op.create_index('ix_lessons_cache_key', 'lessons', ['cache_key'])
+    else:
+        _add_column_if_missing('lessons', sa.Column('cache_key', sa.String(length=64), nullable=True), 'ix_lessons_cache_key')
+
+    if _create_table_if_missing(
+        'user_challenges',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('challenge_id', sa.String(), nullable=True),
+        sa.Column('language', sa.String(), nullable=True),
+        sa.Column('code', sa.Text(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.Column('xp_awarded', sa.Integer(), nullable=True),
+    ):
+        op.create_index('ix_user_challenges_id', 'user_challenges', ['id'])
+        op.create_index('ix_user_challenges_challenge_id', 'user_challenges', ['challenge_id'])
+
+    if _create_table_if_missing(
+        'verification_cache',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('cache_key', sa.String(length=64), nullable=True),
+        sa.Column('challenge_id', sa.String(), nullable=True),
+        sa.Column('language', sa.String(), nullable=True),
+        sa.Column('is_correct', sa.Boolean(), nullable=True),
+        sa.Column('feedback', sa.Text(), nullable=True),
+        sa.Column('test_results', sa.JSON(), nullable=True),
+        sa.Column('hits', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('last_used_at', sa.DateTime(), nullable=True),
+    ):
+        op.create_index('ix_verification_cache_id', 'verification_cache', ['id'])
+        op.create_index('ix_verification_cache_cache_key', 'verification_cache', ['cache_key'], unique=True)
+        op.create_index('ix_verification_cache_challenge_id', 'verification_cache', ['challenge_id'])
+        op.create_index('ix_verification_cache_last_used_at', 'verification_cache', ['last_used_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ['verification_cache', 'user_challenges', 'lessons', 'topic_progress', 'roadmaps', 'users']:
+        op.drop_table(table)
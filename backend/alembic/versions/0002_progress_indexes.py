@@ -0,0 +1,66 @@
+"""composite indexes and unique constraints for topic_progress and user_challenges
+
+Revision ID: 0002_progress_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-18 00:00:01
+
+Duplicate rows (possible before the constraints existed) are collapsed first:
+topic_progress keeps the newest row per position, user_challenges keeps the first completion.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_progress_indexes'
+down_revision: Union[str, Sequence[str], None] = '0001_baseline'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        """
+        DELETE FROM topic_progress
+        WHERE id NOT IN (
+            SELECT keep_id FROM (
+                SELECT MAX(id) AS keep_id FROM topic_progress
+                GROUP BY user_id, roadmap_id, module_index, topic_index
+            ) AS latest
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM user_challenges
+        WHERE id NOT IN (
+            SELECT keep_id FROM (
+                SELECT MIN(id) AS keep_id FROM user_challenges
+                GROUP BY user_id, challenge_id
+            ) AS first_completion
+        )
+        """
+    )
+
+    op.create_index(
+        'uq_topic_progress_position', 'topic_progress',
+        ['user_id', 'roadmap_id', 'module_index', 'topic_index'], unique=True
+    )
+    op.create_index(
+        'ix_topic_progress_user_roadmap_completed', 'topic_progress',
+        ['user_id', 'roadmap_id', 'is_completed']
+    )
+    op.create_index(
+        'uq_user_challenges_user_challenge', 'user_challenges',
+        ['user_id', 'challenge_id'], unique=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_user_challenges_user_challenge', table_name='user_challenges')
+    op.drop_index('ix_topic_progress_user_roadmap_completed', table_name='topic_progress')
+    op.drop_index('uq_topic_progress_position', table_name='topic_progress')
@@ -0,0 +1,44 @@
+"""roadmaps.total_topics
+
+Revision ID: 0003_roadmap_total_topics
+Revises: 0002_progress_indexes
+Create Date: 2026-10-18 00:00:02
+
+Stores each roadmap's topic count so /user/stats doesn't have to load and walk
+the JSON content. Existing rows are backfilled from their content.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_roadmap_total_topics'
+down_revision: Union[str, Sequence[str], None] = '0002_progress_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+roadmaps = sa.table(
+    'roadmaps',
+    sa.column('id', sa.Integer()),
+    sa.column('content', sa.JSON()),
+    sa.column('total_topics', sa.Integer()),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('roadmaps', sa.Column('total_topics', sa.Integer(), nullable=True))
+
+    bind = op.get_bind()
+    for roadmap_id, content in bind.execute(sa.select(roadmaps.c.id, roadmaps.c.content)).fetchall():
+        total = 0
+        if content and "roadmap" in content:
+            total = sum(len(module.get("topics", [])) for module in content["roadmap"])
+        bind.execute(roadmaps.update().where(roadmaps.c.id == roadmap_id).values(total_topics=total))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('roadmaps', 'total_topics')
@@ -0,0 +1,36 @@
+"""leaderboard index on users.total_xp
+
+Revision ID: 0004_leaderboard_index
+Revises: 0003_roadmap_total_topics
+Create Date: 2026-10-18 00:00:03
+
+Index matching the leaderboard order (total_xp DESC, id) so top-N pages and
+"my rank" counts are index scans. NULL XP is normalized to 0 first so it sorts
+like zero on every database.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004_leaderboard_index'
+down_revision: Union[str, Sequence[str], None] = '0003_roadmap_total_topics'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("UPDATE users SET total_xp = 0 WHERE total_xp IS NULL")
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('total_xp', existing_type=sa.Integer(), server_default='0')
+    op.create_index('ix_users_total_xp_rank', 'users', [sa.text('total_xp DESC'), 'id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_total_xp_rank', table_name='users')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('total_xp', existing_type=sa.Integer(), server_default=None)
@@ -0,0 +1,81 @@
+"""roadmap_topics table
+
+Revision ID: 0005_roadmap_topics
+Revises: 0004_leaderboard_index
+Create Date: 2026-10-18 00:00:04
+
+One row per topic of roadmaps.content (position, title, normalized title), so topic
+counts and GitHub skill matching don't deserialize the JSON blob. Existing roadmaps
+are backfilled from their content.
+"""
+import re
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005_roadmap_topics'
+down_revision: Union[str, Sequence[str], None] = '0004_leaderboard_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+roadmaps = sa.table(
+    'roadmaps',
+    sa.column('id', sa.Integer()),
+    sa.column('content', sa.JSON()),
+)
+
+_NON_WORD = re.compile(r"[^a-z0-9+#.]+")
+
+
+def _normalize(text):
+    # Frozen copy of core.text.normalize_topic as of this revision
+    if not text:
+        return ""
+    text = _NON_WORD.sub(" ", unicodedata.normalize("NFKC", text).lower())
+    return " ".join(part.strip(".") for part in text.split() if part.strip("."))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    roadmap_topics = op.create_table(
+        'roadmap_topics',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('roadmap_id', sa.Integer(), sa.ForeignKey('roadmaps.id'), nullable=False),
+        sa.Column('module_index', sa.Integer(), nullable=False),
+        sa.Column('topic_index', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('normalized_title', sa.String(), nullable=True),
+    )
+    op.create_index('ix_roadmap_topics_id', 'roadmap_topics', ['id'])
+    op.create_index('ix_roadmap_topics_normalized_title', 'roadmap_topics', ['normalized_title'])
+    op.create_index(
+        'uq_roadmap_topics_position', 'roadmap_topics',
+        ['roadmap_id', 'module_index', 'topic_index'], unique=True
+    )
+
+    bind = op.get_bind()
+    for roadmap_id, content in bind.execute(sa.select(roadmaps.c.id, roadmaps.c.content)).fetchall():
+        if not content or "roadmap" not in content:
+            continue
+        rows = [
+            {
+                "roadmap_id": roadmap_id,
+                "module_index": m_index,
+                "topic_index": t_index,
+                "title": str(topic),
+                "normalized_title": _normalize(str(topic)),
+            }
+            for m_index, module in enumerate(content["roadmap"])
+            for t_index, topic in enumerate(module.get("topics", []))
+        ]
+        if rows:
+            op.bulk_insert(roadmap_topics, rows)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('roadmap_topics')
@@ -0,0 +1,56 @@
+"""github_response_cache and github_repo_scans
+
+Revision ID: 0006_github_scan_cache
+Revises: 0005_roadmap_topics
+Create Date: 2026-10-18 00:00:05
+
+Stored GitHub API responses (for ETag / If-None-Match revalidation) and per-repo
+deep-scan results, so re-analyzing a GitHub account is incremental.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006_github_scan_cache'
+down_revision: Union[str, Sequence[str], None] = '0005_roadmap_topics'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'github_response_cache',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('owner', sa.String(), nullable=True),
+        sa.Column('url', sa.String(), nullable=True),
+        sa.Column('etag', sa.String(), nullable=True),
+        sa.Column('link', sa.Text(), nullable=True),
+        sa.Column('body', sa.Text(), nullable=True),
+        sa.Column('fetched_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_github_response_cache_id', 'github_response_cache', ['id'])
+    op.create_index('ix_github_response_cache_owner', 'github_response_cache', ['owner'])
+    op.create_index('ix_github_response_cache_url', 'github_response_cache', ['url'], unique=True)
+
+    op.create_table(
+        'github_repo_scans',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('owner', sa.String(), nullable=False),
+        sa.Column('repo', sa.String(), nullable=False),
+        sa.Column('pushed_at', sa.String(), nullable=True),
+        sa.Column('languages', sa.JSON(), nullable=True),
+        sa.Column('skills', sa.JSON(), nullable=True),
+        sa.Column('scanned_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_github_repo_scans_id', 'github_repo_scans', ['id'])
+    op.create_index('uq_github_repo_scans_owner_repo', 'github_repo_scans', ['owner', 'repo'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('github_repo_scans')
+    op.drop_table('github_response_cache')
@@ -0,0 +1,44 @@
+"""generation_jobs
+
+Revision ID: 0007_generation_jobs
+Revises: 0006_github_scan_cache
+Create Date: 2026-10-18 00:00:06
+
+Persisted state of background generation jobs (services/job_queue.py).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007_generation_jobs'
+down_revision: Union[str, Sequence[str], None] = '0006_github_scan_cache'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'generation_jobs',
+        sa.Column('id', sa.String(length=32), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('params', sa.JSON(), nullable=True),
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('callback_url', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_generation_jobs_status_created', 'generation_jobs', ['status', 'created_at'])
+    op.create_index('ix_generation_jobs_user_status', 'generation_jobs', ['user_id', 'status'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('generation_jobs')
@@ -0,0 +1,39 @@
+"""quiz_bank
+
+Revision ID: 0008_quiz_bank
+Revises: 0007_generation_jobs
+Create Date: 2026-10-18 00:00:07
+
+Pool of generated quizzes per (normalized topic, difficulty) (services/quiz_bank.py).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008_quiz_bank'
+down_revision: Union[str, Sequence[str], None] = '0007_generation_jobs'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'quiz_bank',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('topic_key', sa.String(), nullable=False),
+        sa.Column('topic', sa.String(), nullable=False),
+        sa.Column('difficulty', sa.String(), nullable=False),
+        sa.Column('prompt_version', sa.String(), nullable=False),
+        sa.Column('questions', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_quiz_bank_lookup', 'quiz_bank', ['topic_key', 'difficulty', 'prompt_version'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('quiz_bank')
@@ -0,0 +1,43 @@
+"""roadmap generation inputs
+
+Revision ID: 0009_roadmap_inputs
+Revises: 0008_quiz_bank
+Create Date: 2026-10-18 00:00:08
+
+Stores the goal / skills a roadmap was generated from (and whether a resume was
+used), so similar requests can reuse it (services/roadmap_index.py).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009_roadmap_inputs'
+down_revision: Union[str, Sequence[str], None] = '0008_quiz_bank'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('roadmaps') as batch_op:
+        batch_op.add_column(sa.Column('goal', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('current_skills', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('has_resume', sa.Boolean(), nullable=True))
+        batch_op.add_column(sa.Column('source_roadmap_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_roadmaps_source_roadmap_id', 'roadmaps', ['source_roadmap_id'], ['id'])
+    # Titles have always been "Roadmap to <goal>"; skills and resume use were never stored,
+    # so has_resume stays NULL and these rows are not reused
+    op.execute("UPDATE roadmaps SET goal = substr(title, 12) WHERE goal IS NULL AND title LIKE 'Roadmap to %'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('roadmaps') as batch_op:
+        batch_op.drop_constraint('fk_roadmaps_source_roadmap_id', type_='foreignkey')
+        batch_op.drop_column('source_roadmap_id')
+        batch_op.drop_column('has_resume')
+        batch_op.drop_column('current_skills')
+        batch_op.drop_column('goal')
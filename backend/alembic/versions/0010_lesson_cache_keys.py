@@ -0,0 +1,82 @@
+"""lessons.cache_key and roadmap_topics.normalized_title backfill
+
+Revision ID: 0010_lesson_cache_keys
+Revises: 0009_roadmap_inputs
+Create Date: 2026-10-18 00:00:09
+
+Data migration. Lessons saved before cache keys existed have none (the backfill used
+to live in migrate_db.py), and keys of non-Latin topics were computed when
+normalize_topic dropped every non-ASCII letter, so they all collided. Every key is
+recomputed; topics that normalize to "" get none, so they are never served from cache.
+roadmap_topics.normalized_title (filled in 0005) had the same problem and is recomputed
+with the same normalizer, so skill matches against non-Latin topic titles work.
+"""
+import hashlib
+import re
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010_lesson_cache_keys'
+down_revision: Union[str, Sequence[str], None] = '0009_roadmap_inputs'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+lessons = sa.table(
+    'lessons',
+    sa.column('id', sa.Integer()),
+    sa.column('topic', sa.String()),
+    sa.column('context', sa.String()),
+    sa.column('cache_key', sa.String(64)),
+)
+
+roadmap_topics = sa.table(
+    'roadmap_topics',
+    sa.column('id', sa.Integer()),
+    sa.column('title', sa.String()),
+    sa.column('normalized_title', sa.String()),
+)
+
+_NON_WORD = re.compile(r"[^\w+#.]+|_")
+
+
+def _normalize(text):
+    # Frozen copy of core.text.normalize_topic as of this revision
+    if not text:
+        return ""
+    text = _NON_WORD.sub(" ", unicodedata.normalize("NFKC", text).casefold())
+    return " ".join(part.strip(".") for part in text.split() if part.strip("."))
+
+
+def _lesson_key(topic, context):
+    # Frozen copy of services.lesson_service.lesson_key for lesson prompt v1
+    if not _normalize(topic):
+        return None
+    return hashlib.sha256((_normalize(topic) + "\x00" + _normalize(context)).encode()).hexdigest()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(lessons.c.id, lessons.c.topic, lessons.c.context, lessons.c.cache_key)).fetchall()
+    for lesson_id, topic, context, cache_key in rows:
+        key = _lesson_key(topic or "", context or "")
+        if key != cache_key:
+            bind.execute(lessons.update().where(lessons.c.id == lesson_id).values(cache_key=key))
+
+    rows = bind.execute(sa.select(roadmap_topics.c.id, roadmap_topics.c.title, roadmap_topics.c.normalized_title)).fetchall()
+    for topic_id, title, normalized in rows:
+        value = _normalize(title or "")
+        if value != normalized:
+            bind.execute(roadmap_topics.update().where(roadmap_topics.c.id == topic_id).values(normalized_title=value))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Keys stay valid for the code of the previous revision (lookups fall back to the raw topic),
+    # and the old normalizer's titles are only worse, not wrong
+    pass
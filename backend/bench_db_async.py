@@ -0,0 +1,115 @@
+"""
+Compares request throughput of the old sync-session routes with the async engine (database.py).
+
+    python bench_db_async.py [requests] [concurrency] [latency_ms]
+
+Both variants run the same query against a throwaway SQLite file through a small FastAPI
+app. `latency_ms` is added to every statement inside the DB driver to stand in for the
+network round trip to Postgres; with the sync Session that wait blocks the event loop,
+with aiosqlite/asyncpg it doesn't.
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from models import Base, Roadmap, User
+
+LATENCY = 0.002
+
+
+class SlowCursor(sqlite3.Cursor):
+    def execute(self, *args, **kwargs):
+        time.sleep(LATENCY)
+        return super().execute(*args, **kwargs)
+
+
+class SlowConnection(sqlite3.Connection):
+    def cursor(self, factory=SlowCursor):
+        return super().cursor(factory)
+
+
+def build_app(path: str, concurrency: int) -> FastAPI:
+    connect_args = {"check_same_thread": False, "factory": SlowConnection}
+    # Unbounded overflow: sessions are released after the response is sent, and a sync
+    # checkout that has to wait for one blocks the very loop that would release it
+    pool = {"pool_size": concurrency, "max_overflow": -1}
+    sync_engine = create_engine(f"sqlite:///{path}", connect_args=connect_args, **pool)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args=connect_args, **pool)
+    SyncSession = sessionmaker(bind=sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    def get_sync_db():
+        db = SyncSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app = FastAPI()
+
+    # Old style: async route calling the sync Session directly
+    @app.get("/sync/{user_id}")
+    async def sync_route(user_id: int, db: Session = Depends(get_sync_db)):
+        return len(db.query(Roadmap).filter(Roadmap.user_id == user_id).all())
+
+    @app.get("/async/{user_id}")
+    async def async_route(user_id: int, db: AsyncSession = Depends(get_async_db)):
+        return len((await db.execute(select(Roadmap).where(Roadmap.user_id == user_id))).scalars().all())
+
+    app.state.engines = (sync_engine, async_engine)
+    return app
+
+
+async def run(app: FastAPI, prefix: str, total: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            async with semaphore:
+                response = await client.get(f"/{prefix}/{i % 50 + 1}")
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return time.perf_counter() - started
+
+
+async def main(total: int, concurrency: int):
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "bench.db")
+        app = build_app(path, concurrency)
+        sync_engine, async_engine = app.state.engines
+        Base.metadata.create_all(sync_engine)
+        with sessionmaker(bind=sync_engine)() as db:
+            db.add_all(User(email=f"u{i}@bench.dev", total_xp=0) for i in range(50))
+            db.flush()
+            db.add_all(Roadmap(title=f"Roadmap {i}", user_id=i % 50 + 1, content={}) for i in range(500))
+            db.commit()
+
+        for prefix in ("sync", "async"):
+            await run(app, prefix, concurrency, concurrency)  # warm up pools
+            elapsed = await run(app, prefix, total, concurrency)
+            print(f"{prefix:>5}: {total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+
+        sync_engine.dispose()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    LATENCY = (float(sys.argv[3]) if len(sys.argv) > 3 else 2) / 1000
+    asyncio.run(main(total, concurrency))
@@ -0,0 +1,78 @@
+"""
+Measures connection reuse of the shared HTTP client (core/http.py) against a local mock upstream.
+
+    python bench_http_pool.py [requests] [concurrency]
+
+Compares a fresh httpx.AsyncClient per request (old behaviour) with the pooled client.
+"""
+import asyncio
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from core.http import create_async_client
+
+
+class MockUpstream(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with MockUpstream.lock:
+            MockUpstream.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        body = b'{"choices": [{"message": {"content": "{}"}}]}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+async def run(label, total, concurrency, url, shared_client=None):
+    MockUpstream.connections = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            if shared_client is not None:
+                await shared_client.post(url, json={"ping": True})
+            else:
+                async with httpx.AsyncClient() as client:
+                    await client.post(url, json={"ping": True})
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(total)])
+    elapsed = time.perf_counter() - start
+    print(f"{label:<18} requests={total} connections={MockUpstream.connections} "
+          f"reuse={1 - MockUpstream.connections / total:.0%} elapsed={elapsed:.2f}s")
+
+
+async def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockUpstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/openai/v1/chat/completions"
+
+    await run("client per request", total, concurrency, url)
+    async with create_async_client() as client:
+        await run("shared client", total, concurrency, url, shared_client=client)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache with a per-entry time-to-live.
+    Used for the in-process hot tiers (auth principals, lessons, verification results...).
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,39 @@
+import os
+import importlib.util
+import httpx
+from fastapi import Request
+
+# Shared, keep-alive HTTP clients. They are created once in main.py's lifespan and
+# handed to the services, so upstream calls (Groq, GitHub) reuse pooled connections
+# instead of paying a TLS handshake per request.
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+# HTTP/2 needs the optional `h2` package (httpx[http2]); silently stay on HTTP/1.1 without it
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true" and importlib.util.find_spec("h2") is not None
+
+
+def _client_options(timeout: float = None, **kwargs) -> dict:
+    options = {
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(timeout or HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        "http2": HTTP2_ENABLED,
+    }
+    options.update(kwargs)
+    return options
+
+
+def create_async_client(timeout: float = None, **kwargs) -> httpx.AsyncClient:
+    return httpx.AsyncClient(**_client_options(timeout, **kwargs))
+
+
+# --- FastAPI dependencies ---
+
+def get_github_client(request: Request) -> httpx.AsyncClient:
+    return request.app.state.github_client
@@ -1,11 +1,16 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.concurrency import run_in_threadpool
 from supabase import create_client, Client
+import hmac
 import os
 import jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 from database import get_db
 from models import User
+from core.cache import TTLCache
 
 # Initialize Supabase Client (for admin tasks if needed, but mostly for verification)
 url: str = os.environ.get("SUPABASE_URL") or os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
@@ -14,36 +19,146 @@ key: str = os.environ.get("SUPABASE_ANON_KEY") or os.environ.get("NEXT_PUBLIC_SU
 if not url or not key:
     print("WARNING: Supabase URL or Key not found in environment variables.")
 
-# For JWT verification, we need the JWT Secret if we were doing manual local verification.
-# However, Supabase-py client can also getUser from the token.
-# Let's use the simplest approach: Pass the token to Supabase `get_user`.
+# Local JWT verification settings.
+# AUTH_VERIFY_MODE:
+#   "local"  -> verify tokens locally, fall back to the Supabase API only if local verification is unavailable
+#   "remote" -> always ask the Supabase API (old behaviour)
+AUTH_VERIFY_MODE = os.environ.get("AUTH_VERIFY_MODE", "local").lower()
+JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET")
+JWT_AUDIENCE = os.environ.get("SUPABASE_JWT_AUDIENCE", "authenticated")
+JWKS_URL = os.environ.get("SUPABASE_JWKS_URL") or (f"{url.rstrip('/')}/auth/v1/.well-known/jwks.json" if url else None)
+JWKS_REFRESH_SECONDS = int(os.environ.get("SUPABASE_JWKS_REFRESH_SECONDS", "600"))
+# Bearer token for /metrics (scrapers / ops only). Unset -> the endpoint is disabled.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+ASYMMETRIC_ALGORITHMS = ["RS256", "ES256", "EdDSA"]
+
+# Authenticated principal cache: supabase_id -> snapshot of the local `users` row.
+# Lets get_current_user skip the per-request sync queries. Entries are dropped by
+# invalidate_user() whenever a route changes the row, and expire after the TTL so
+# writes from other workers are picked up eventually.
+principal_cache = TTLCache(
+    maxsize=int(os.environ.get("AUTH_PRINCIPAL_CACHE_SIZE", "4096")),
+    ttl=float(os.environ.get("AUTH_PRINCIPAL_CACHE_TTL", "60")),
+)
 
 security = HTTPBearer()
+optional_bearer = HTTPBearer(auto_error=False)
+
+_supabase_client: Client = None
+_jwks_client: jwt.PyJWKClient = None
+
+
+class LocalVerificationUnavailable(Exception):
+    """Raised when a token cannot be checked locally (no secret / unknown key), so the remote API should decide."""
+
+
+def get_supabase_client() -> Client:
+    # One client per process instead of one per request
+    global _supabase_client
+    if _supabase_client is None:
+        _supabase_client = create_client(url, key)
+    return _supabase_client
+
+
+def get_jwks_client() -> jwt.PyJWKClient:
+    # PyJWKClient caches the key set and re-fetches it once `lifespan` seconds have passed
+    global _jwks_client
+    if _jwks_client is None and JWKS_URL:
+        _jwks_client = jwt.PyJWKClient(JWKS_URL, cache_jwk_set=True, lifespan=JWKS_REFRESH_SECONDS)
+    return _jwks_client
+
+
+def verify_token_locally(token: str) -> dict:
+    """
+    Verifies a Supabase access token without a network call (except the periodic JWKS refresh).
+    Returns the decoded claims. Raises jwt.InvalidTokenError for bad tokens and
+    LocalVerificationUnavailable when we have nothing to verify against.
+    """
+    header = jwt.get_unverified_header(token)
+    algorithm = header.get("alg")
+
+    if algorithm == "HS256":
+        if not JWT_SECRET:
+            raise LocalVerificationUnavailable("SUPABASE_JWT_SECRET not set")
+        signing_key = JWT_SECRET
+    elif algorithm in ASYMMETRIC_ALGORITHMS:
+        jwks_client = get_jwks_client()
+        if jwks_client is None:
+            raise LocalVerificationUnavailable("No JWKS URL configured")
+        try:
+            signing_key = jwks_client.get_signing_key_from_jwt(token).key
+        except jwt.PyJWKClientError as e:
+            # Unreachable JWKS endpoint or unknown kid (e.g. keys rotated since the last refresh)
+            raise LocalVerificationUnavailable(str(e))
+    else:
+        raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm: {algorithm}")
+
+    return jwt.decode(
+        token,
+        signing_key,
+        algorithms=[algorithm],
+        audience=JWT_AUDIENCE,
+        options={"require": ["sub", "exp"]},
+    )
+
+
+def verify_token_remotely(token: str) -> dict:
+    # Option 1: Verify via Supabase API (Slower but safest)
+    user_response = get_supabase_client().auth.get_user(token)
+    if not user_response.user:
+        raise jwt.InvalidTokenError("Supabase rejected the token")
+    return {"sub": user_response.user.id, "email": user_response.user.email}
+
+
+def verify_token(token: str) -> dict:
+    """Returns the token claims (`sub`, `email`), preferring local verification."""
+    if AUTH_VERIFY_MODE != "remote":
+        try:
+            return verify_token_locally(token)
+        except LocalVerificationUnavailable as e:
+            print(f"Local JWT verification unavailable ({e}). Falling back to Supabase API.")
+    return verify_token_remotely(token)
+
+
+def _snapshot(user: User) -> dict:
+    return {column.key: getattr(user, column.key) for column in User.__table__.columns}
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+
+async def _user_from_snapshot(db: AsyncSession, snapshot: dict) -> User:
+    # Rebuild the row as a detached instance and attach it without a SELECT,
+    # so routes can still modify and commit it like a freshly queried user.
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return await db.merge(user, load=False)
+
+
+def invalidate_user(user: User):
+    """Drops a user from the principal cache. Call after writing to the `users` row."""
+    if user is not None and user.supabase_id:
+        principal_cache.pop(user.supabase_id)
+
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_db)):
     token = credentials.credentials
-    
+
     try:
-        # Option 1: Verify via Supabase API (Slower but safest)
-        supabase: Client = create_client(url, key)
-        user_response = supabase.auth.get_user(token)
-        
-        if not user_response.user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-            
-        supabase_user_id = user_response.user.id
-        email = user_response.user.email
-        
+        # JWKS refreshes and the remote fallback do blocking HTTP, so keep them off the event loop
+        claims = await run_in_threadpool(verify_token, token)
+
+        supabase_user_id = claims["sub"]
+        email = claims.get("email")
+
+        cached = principal_cache.get(supabase_user_id)
+        if cached is not None:
+            return await _user_from_snapshot(db, cached)
+
         # Sync with local DB
-        db_user = db.query(User).filter(User.supabase_id == supabase_user_id).first()
-        
+        db_user = (await db.execute(select(User).where(User.supabase_id == supabase_user_id))).scalars().first()
+
         if not db_user:
             # Check if user exists by email (legacy/first login sync)
-            db_user = db.query(User).filter(User.email == email).first()
+            db_user = (await db.execute(select(User).where(User.email == email))).scalars().first() if email else None
             if db_user:
                 # Link existing user
                 db_user.supabase_id = supabase_user_id
@@ -55,10 +170,11 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
                     is_active=True
                 )
                 db.add(db_user)
-            
-            db.commit()
-            db.refresh(db_user)
-            
+
+            await db.commit()
+            await db.refresh(db_user)
+
+        principal_cache.set(supabase_user_id, _snapshot(db_user))
         return db_user
 
     except Exception as e:
@@ -68,3 +184,15 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+async def require_metrics_token(credentials: HTTPAuthorizationCredentials = Depends(optional_bearer)):
+    if not METRICS_TOKEN:
+        # Not configured: don't advertise that the endpoint exists
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if credentials is None or not hmac.compare_digest(credentials.credentials.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
@@ -0,0 +1,30 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent async work by key: while a call for `key` is in flight,
+    other callers await the same result instead of starting their own.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    def start(self, key, fn):
+        """The in-flight task for `key`, starting fn() if there is none. Registers before returning."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def do(self, key, fn):
+        # Shielded so one caller disconnecting doesn't cancel the work for everyone else
+        return await asyncio.shield(self.start(key, fn))
+
+    def __contains__(self, key):
+        return key in self._inflight
+
+    def __len__(self):
+        return len(self._inflight)
@@ -0,0 +1,12 @@
+import json
+
+# Keep proxies (nginx / Render) from buffering the stream
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event: str, data) -> str:
+    """Formats one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,29 @@
+import re
+import unicodedata
+
+# Anything but letters/digits (any script), + # and . ; underscores count as separators
+_NON_WORD = re.compile(r"[^\w+#.]+|_")
+
+
+def normalize_topic(text: str) -> str:
+    """
+    Canonical form of a topic/context string for cache keys and matching:
+    "React Hooks", "react  hooks " and "React-Hooks!" all become "react hooks".
+    Keeps + # . so "C++", "C#" and "Node.js" stay distinct, and letters of every
+    script ("Café", "机器学习"). Only punctuation-only input normalizes to "".
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _NON_WORD.sub(" ", text)
+    return " ".join(part.strip(".") for part in text.split() if part.strip("."))
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough Llama-style token count without loading a tokenizer: about 4 characters
+    per token for English prose, but never fewer tokens than words.
+    """
+    if not text:
+        return 0
+    return max((len(text) + 3) // 4, len(text.split()))
@@ -0,0 +1,53 @@
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+
+class BodySizeLimitMiddleware:
+    """
+    Rejects request bodies over `max_body_size` with a 413 while they are still
+    arriving, instead of after the multipart parser has spooled the whole upload.
+    Only applies to paths starting with one of `path_prefixes` (all paths if empty).
+    """
+
+    def __init__(self, app, max_body_size: int, path_prefixes=()):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.path_prefixes = tuple(path_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (self.path_prefixes and not scope["path"].startswith(self.path_prefixes)):
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body too large. Max size is {self.max_body_size // (1024 * 1024)}MB."
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_body_size:
+                await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+                return
+
+        # Chunked uploads (or a lying Content-Length) are counted as they stream in
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except HTTPException as e:
+            # Raised outside a route (e.g. while a middleware reads the body)
+            if e.status_code != 413 or response_started:
+                raise
+            await JSONResponse({"detail": e.detail}, status_code=413)(scope, receive, send)
@@ -1,22 +1,58 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
-from database import engine, Base
+from database import engine, async_engine, Base, pool_status
 from routers import roadmap, learning, user, github, gamification, challenges
 import models
 
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from core.limiter import limiter
+from core.security import require_metrics_token
+from core.http import create_async_client
+from core.upload_limit import BodySizeLimitMiddleware
+from services import prompts
+from services.llm_client import llm_client
+from services.github_service import GITHUB_API_URL, github_headers
+from services.job_queue import job_queue
+from services.roadmap_service import run_roadmap_job
+from services.resume_parser import resume_parser, RESUME_MAX_BYTES
+from services.quiz_bank import quiz_warmer
+from services.lesson_prefetch import lesson_prefetcher
+from services.roadmap_index import roadmap_index
 
 # Create database tables
 # models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="CodeForge AI API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pooled keep-alive clients shared by every request for the lifetime of the worker
+    # (Groq's is only used through llm_client)
+    groq_client = create_async_client(timeout=float(os.getenv("GROQ_TIMEOUT", "60")))
+    app.state.github_client = create_async_client(base_url=GITHUB_API_URL, headers=github_headers())
+    llm_client.configure_http_client(groq_client)
+    # Background generation workers (POST /api/v1/roadmap/jobs)
+    job_queue.register("roadmap", run_roadmap_job, transient_params=("resume_text",))
+    await job_queue.start()
+    # Generates lessons and fills the quiz bank for new roadmaps in the background
+    await lesson_prefetcher.start()
+    await quiz_warmer.start()
+    yield
+    await job_queue.stop()
+    await lesson_prefetcher.stop()
+    await quiz_warmer.stop()
+    resume_parser.shutdown()
+    llm_client.configure_http_client()
+    await groq_client.aclose()
+    await app.state.github_client.aclose()
+    await async_engine.dispose()
+
+app = FastAPI(title="CodeForge AI API", version="0.1.0", lifespan=lifespan)
 
 # Set up Rate Limiter
 app.state.limiter = limiter
@@ -35,6 +71,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Resume uploads: cut the connection off as soon as the body passes the file limit
+# (plus room for the form fields) rather than spooling all of it first
+app.add_middleware(BodySizeLimitMiddleware, max_body_size=RESUME_MAX_BYTES + 64 * 1024, path_prefixes=("/api/v1/roadmap/",))
+
 app.include_router(roadmap.router, prefix="/api/v1/roadmap", tags=["roadmap"])
 app.include_router(learning.router, prefix="/api/v1/learning", tags=["learning"])
 app.include_router(user.router, prefix="/api/v1/user", tags=["user"])
@@ -45,3 +85,15 @@ app.include_router(challenges.router, prefix="/api/v1/challenges", tags=["challe
 @app.get("/")
 async def root():
     return {"message": "Welcome to CodeForge AI API"}
+
+@app.get("/metrics", dependencies=[Depends(require_metrics_token)])
+async def metrics():
+    """Per-worker stats (bearer METRICS_TOKEN required): connection pool (checkouts, overflow, wait times), prompt versions/sizes, roadmap reuse, prefetch, upstream LLM health."""
+    return {
+        "pid": os.getpid(),
+        "db_pool": pool_status(),
+        "prompts": prompts.prompt_stats(),
+        "roadmap_index": roadmap_index.stats(),
+        "lesson_prefetch": lesson_prefetcher.stats(),
+        "llm": llm_client.stats()
+    }
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, JSON, DateTime, Text
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, JSON, DateTime, Text, Index
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -13,12 +13,17 @@ class User(Base):
     hashed_password = Column(String, nullable=True) # Optional for OAuth users
     is_active = Column(Boolean, default=True)
     github_username = Column(String, nullable=True)
-    total_xp = Column(Integer, default=0)
+    total_xp = Column(Integer, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     # Relationships
     roadmaps = relationship("Roadmap", back_populates="user")
 
+    __table_args__ = (
+        # Leaderboard order (most XP first, oldest account on ties) and rank lookups
+        Index("ix_users_total_xp_rank", total_xp.desc(), id),
+    )
+
 class Roadmap(Base):
     __tablename__ = "roadmaps"
 
@@ -27,10 +32,31 @@ class Roadmap(Base):
     description = Column(Text, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     content = Column(JSON) # Stores the huge JSON structure of the roadmap
+    total_topics = Column(Integer, nullable=True) # Topic count of `content`, filled at creation
+    # Generation inputs, for reusing roadmaps across similar requests (services/roadmap_index.py)
+    goal = Column(String, nullable=True)
+    current_skills = Column(Text, nullable=True)
+    has_resume = Column(Boolean, nullable=True) # NULL: created before this was recorded
+    source_roadmap_id = Column(Integer, ForeignKey("roadmaps.id"), nullable=True) # set when content was reused
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     user = relationship("User", back_populates="roadmaps")
 
+class RoadmapTopic(Base):
+    __tablename__ = "roadmap_topics"
+
+    # One row per topic of Roadmap.content, so counts and skill matching are plain SQL
+    id = Column(Integer, primary_key=True, index=True)
+    roadmap_id = Column(Integer, ForeignKey("roadmaps.id"), nullable=False)
+    module_index = Column(Integer, nullable=False)
+    topic_index = Column(Integer, nullable=False)
+    title = Column(String)
+    normalized_title = Column(String, index=True) # core.text.normalize_topic(title)
+
+    __table_args__ = (
+        Index("uq_roadmap_topics_position", "roadmap_id", "module_index", "topic_index", unique=True),
+    )
+
 class TopicProgress(Base):
     __tablename__ = "topic_progress"
 
@@ -42,12 +68,20 @@ class TopicProgress(Base):
     is_completed = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+    __table_args__ = (
+        # One row per topic position; progress writes upsert on this
+        Index("uq_topic_progress_position", "user_id", "roadmap_id", "module_index", "topic_index", unique=True),
+        # Completed-topic counts for /user/stats
+        Index("ix_topic_progress_user_roadmap_completed", "user_id", "roadmap_id", "is_completed"),
+    )
+
 class Lesson(Base):
     __tablename__ = "lessons"
 
     id = Column(Integer, primary_key=True, index=True)
     topic = Column(String, index=True)
     context = Column(String, nullable=True) 
+    cache_key = Column(String(64), index=True, nullable=True) # sha256 of normalized (topic, context)
     title = Column(String)
     content_markdown = Column(Text)
     estimated_time = Column(String)
@@ -63,3 +97,87 @@ class UserChallenge(Base):
     code = Column(Text)
     completed_at = Column(DateTime, default=datetime.datetime.utcnow)
     xp_awarded = Column(Integer)
+
+    __table_args__ = (
+        # A challenge can only be completed (and award XP) once per user
+        Index("uq_user_challenges_user_challenge", "user_id", "challenge_id", unique=True),
+    )
+
+class VerificationCacheEntry(Base):
+    __tablename__ = "verification_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), unique=True, index=True) # sha256 of (challenge, language, grader, normalized code)
+    challenge_id = Column(String, index=True)
+    language = Column(String)
+    is_correct = Column(Boolean)
+    feedback = Column(Text)
+    test_results = Column(JSON, nullable=True)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+class GitHubResponseCache(Base):
+    __tablename__ = "github_response_cache"
+
+    # Last 200 response per GitHub API URL, replayed when a conditional request gets a 304
+    id = Column(Integer, primary_key=True, index=True)
+    owner = Column(String, index=True) # lowercased GitHub login the URL belongs to
+    url = Column(String, unique=True, index=True)
+    etag = Column(String)
+    link = Column(Text, nullable=True) # Link header (pagination)
+    body = Column(Text)
+    fetched_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class GitHubRepoScan(Base):
+    __tablename__ = "github_repo_scans"
+
+    # Deep-scan result per repository; reused until the repo is pushed to again
+    id = Column(Integer, primary_key=True, index=True)
+    owner = Column(String, nullable=False) # lowercased GitHub login
+    repo = Column(String, nullable=False)
+    pushed_at = Column(String, nullable=True) # GitHub's timestamp, compared as-is
+    languages = Column(JSON, nullable=True) # {language: bytes}
+    skills = Column(JSON, nullable=True)
+    scanned_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        Index("uq_github_repo_scans_owner_repo", "owner", "repo", unique=True),
+    )
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+
+    # Long-running generation (e.g. a roadmap) processed by services/job_queue.py
+    id = Column(String(32), primary_key=True) # uuid4 hex, handed to the client
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String, nullable=False) # handler name, e.g. "roadmap"
+    status = Column(String, nullable=False, default="queued") # queued / running / done / failed
+    params = Column(JSON)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    callback_url = Column(String, nullable=True) # POSTed the final status, if set
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_generation_jobs_status_created", "status", "created_at"),
+        Index("ix_generation_jobs_user_status", "user_id", "status"),
+    )
+
+class QuizSet(Base):
+    __tablename__ = "quiz_bank"
+
+    # One generated quiz; quizzes for a topic are served by sampling questions across its sets
+    id = Column(Integer, primary_key=True)
+    topic_key = Column(String, nullable=False) # normalize_topic(topic)
+    topic = Column(String, nullable=False)
+    difficulty = Column(String, nullable=False)
+    prompt_version = Column(String, nullable=False) # ai_service.QUIZ_PROMPT.id that produced it
+    questions = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_quiz_bank_lookup", "topic_key", "difficulty", "prompt_version"),
+    )
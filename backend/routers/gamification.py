@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 from models import User
+from core.security import get_current_user
+from services.leaderboard import leaderboard
 from pydantic import BaseModel
 from typing import List
 
@@ -15,32 +17,22 @@ class LeaderboardEntry(BaseModel):
     badges: List[str] = []
 
 @router.get("/leaderboard", response_model=List[LeaderboardEntry])
-async def get_leaderboard(db: Session = Depends(get_db)):
+async def get_leaderboard(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Returns the top 10 users by XP.
+    Returns users ranked by XP (top 10 by default), paginated with offset/limit.
     """
-    # Fetch top 10 users ordered by total_xp desc
-    top_users = db.query(User).order_by(User.total_xp.desc()).limit(10).all()
-    
-    leaderboard = []
-    for index, user in enumerate(top_users):
-        # Determine badges (mock logic or derived from simple rules for now)
-        badges = []
-        if user.total_xp > 1000:
-            badges.append("Pro")
-        if user.github_username:
-             badges.append("Coder")
-             
-        # Use email or full_name (if available) as username
-        display_name = user.full_name or user.email.split("@")[0]
-        if user.github_username:
-             display_name = user.github_username
+    return [LeaderboardEntry(**entry) for entry in await leaderboard.page(db, offset, limit)]
 
-        leaderboard.append(LeaderboardEntry(
-            username=display_name,
-            total_xp=user.total_xp,
-            rank=index + 1,
-            badges=badges
-        ))
-        
-    return leaderboard
+@router.get("/leaderboard/me", response_model=LeaderboardEntry)
+async def get_my_rank(
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    """
+    Returns the current user's leaderboard entry and rank.
+    """
+    return LeaderboardEntry(**await leaderboard.rank_of(db, user))
@@ -1,10 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
-from models import User, TopicProgress, Roadmap
-from core.security import get_current_user
-from services.github_service import analyze_github_user
+from sqlalchemy import select, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, upsert_insert
+from models import User, TopicProgress, Roadmap, RoadmapTopic
+from core.security import get_current_user, invalidate_user
+from services.github_service import analyze_github_user, is_valid_login
+from services.leaderboard import leaderboard
+from services.skill_matcher import SkillMatcher
 from pydantic import BaseModel
+from core.http import get_github_client
+import httpx
+import datetime
 
 router = APIRouter()
 
@@ -14,66 +20,81 @@ class GitHubConnectRequest(BaseModel):
 @router.post("/analyze")
 async def connect_and_analyze_github(
     request: GitHubConnectRequest,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+    client: httpx.AsyncClient = Depends(get_github_client)
 ):
     """
     Connects GitHub account and scans for skills.
     Updates User profile and auto-completes Roadmap topics.
     """
+    # Checked before anything is stored or sent to GitHub (path segments like "../user" are not logins)
+    if not is_valid_login(request.username):
+        raise HTTPException(status_code=400, detail="Invalid GitHub username")
+
     # 1. Update Username
     user.github_username = request.username
-    db.commit()
+    await db.commit()
+    invalidate_user(user)
+    # Display name on the leaderboard switches to the GitHub username
+    leaderboard.record_xp(user)
     
     # 2. Analyze
-    analysis = await analyze_github_user(request.username)
+    analysis = await analyze_github_user(request.username, client, db)
     
     if "error" in analysis:
         raise HTTPException(status_code=404, detail=analysis["error"])
         
-    detected_skills = [s.lower() for s in analysis["detected_skills"]]
+    # Skills + aliases compiled once; each topic title is then matched in a single pass
+    matcher = SkillMatcher(analysis["detected_skills"])
     auto_completed_count = 0
     
     # 3. Auto-complete Topics
-    # Find all active roadmaps for this user
-    roadmaps = db.query(Roadmap).filter(Roadmap.user_id == user.id).all()
+    # Topics of all the user's roadmaps that have no progress row yet, in one query
+    # straight from roadmap_topics (the JSON content isn't loaded)
+    topics = (await db.execute(
+        select(
+            RoadmapTopic.roadmap_id,
+            RoadmapTopic.module_index,
+            RoadmapTopic.topic_index,
+            RoadmapTopic.normalized_title
+        ).join(
+            Roadmap, Roadmap.id == RoadmapTopic.roadmap_id
+        ).outerjoin(
+            TopicProgress,
+            and_(
+                TopicProgress.user_id == user.id,
+                TopicProgress.roadmap_id == RoadmapTopic.roadmap_id,
+                TopicProgress.module_index == RoadmapTopic.module_index,
+                TopicProgress.topic_index == RoadmapTopic.topic_index
+            )
+        ).where(Roadmap.user_id == user.id, TopicProgress.id.is_(None))
+    )).all()
     
-    for roadmap in roadmaps:
-        content = roadmap.content
-        if not content or "roadmap" not in content:
-            continue
-            
-        for m_index, module in enumerate(content["roadmap"]):
-            for t_index, topic in enumerate(module.get("topics", [])):
-                # If topic name is in detected skills (fuzzy match)
-                topic_lower = topic.lower()
-                
-                # Check if any detected skill is a substring of the topic or vice versa
-                match = any(s in topic_lower or topic_lower in s for s in detected_skills)
-                
-                if match:
-                    # Check if already completed
-                    exists = db.query(TopicProgress).filter(
-                        TopicProgress.user_id == user.id,
-                        TopicProgress.roadmap_id == roadmap.id,
-                        TopicProgress.module_index == m_index,
-                        TopicProgress.topic_index == t_index
-                    ).first()
-                    
-                    if not exists:
-                        new_progress = TopicProgress(
-                            user_id=user.id,
-                            roadmap_id=roadmap.id,
-                            module_index=m_index,
-                            topic_index=t_index,
-                            is_completed=True
-                        )
-                        db.add(new_progress)
-                        auto_completed_count += 1
+    now = datetime.datetime.utcnow()
+    new_rows = []
+    for topic in topics:
+        # Whole-word skill/alias match ("js" no longer matches inside "json")
+        if topic.normalized_title and matcher.matches(topic.normalized_title):
+            new_rows.append({
+                "user_id": user.id,
+                "roadmap_id": topic.roadmap_id,
+                "module_index": topic.module_index,
+                "topic_index": topic.topic_index,
+                "is_completed": True,
+                "created_at": now
+            })
+
+    if new_rows:
+        # One bulk insert; positions that got progress in the meantime are left as they are
+        stmt = upsert_insert(TopicProgress).values(new_rows).on_conflict_do_nothing(
+            index_elements=["user_id", "roadmap_id", "module_index", "topic_index"]
+        )
+        auto_completed_count = (await db.execute(stmt)).rowcount
 
     # 4. Award XP for connecting (One time bonus)
     # We can handle this logic later, for now just commit progress
-    db.commit()
+    await db.commit()
     
     return {
         "status": "success",
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, upsert_insert
 import models, schemas
-from services import ai_service
+from services import lesson_service, quiz_bank
 from pydantic import BaseModel
 from core.limiter import limiter
 from core.security import get_current_user
+from core.sse import sse_event, SSE_HEADERS
 from models import User
+import datetime
 
 router = APIRouter()
 
@@ -25,49 +29,76 @@ class ProgressUpdate(BaseModel):
 async def get_lesson(
     request: Request, 
     lesson_request: LessonRequest, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user) # Optional: Lessons could be public, but let's secure for now
 ):
     """
-    Generates an AI lesson for a specific topic, checking the DB first.
+    Generates an AI lesson for a specific topic, checking the cache/DB first.
     """
-    # 1. Check if lesson exists in DB
-    existing_lesson = db.query(models.Lesson).filter(
-        models.Lesson.topic == lesson_request.topic,
-        models.Lesson.context == lesson_request.context
-    ).first()
-
-    if existing_lesson:
-        return {
-            "title": existing_lesson.title,
-            "content_markdown": existing_lesson.content_markdown,
-            "estimated_time": existing_lesson.estimated_time
-        }
-
-    # 2. If not, generate it
-    result = ai_service.generate_lesson(lesson_request.topic, lesson_request.context)
+    # Cache (memory -> DB, normalized key) first; concurrent misses share one generation
+    result = await lesson_service.get_or_generate_lesson(db, lesson_request.topic, lesson_request.context)
     
     if "error" in result:
         raise HTTPException(status_code=500, detail=result["error"])
 
-    # 3. Save to DB
-    new_lesson = models.Lesson(
-        topic=lesson_request.topic,
-        context=lesson_request.context,
-        title=result.get("title", f"Lesson: {lesson_request.topic}"),
-        content_markdown=result.get("content_markdown", ""),
-        estimated_time=result.get("estimated_time", "10 mins")
-    )
-    db.add(new_lesson)
-    db.commit()
-    db.refresh(new_lesson)
+    return result
+
+@router.post("/lesson/stream")
+@limiter.limit("20/minute")
+async def stream_lesson(
+    request: Request,
+    lesson_request: LessonRequest,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    """
+    Same as /lesson but streams the markdown as Server-Sent Events (`token` events,
+    then `done` with the full lesson, or `error`). Cached lessons are sent as a single `done`.
+    """
+    cached = await lesson_service.find_lesson(db, lesson_request.topic, lesson_request.context)
+    if cached is not None:
+        async def cached_stream():
+            yield sse_event("done", cached)
+
+        return StreamingResponse(cached_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    async def event_stream():
+        # Same single-flight as /lesson: concurrent misses share one generation and one stored row
+        async for event, data in lesson_service.stream_lesson(lesson_request.topic, lesson_request.context):
+            if event == "token":
+                yield sse_event("token", {"text": data})
+            else:
+                yield sse_event(event, data)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.get("/quiz")
+@limiter.limit("20/minute")
+async def get_quiz(
+    request: Request,
+    topic: str = Query(..., min_length=1, max_length=200),
+    difficulty: str = "Beginner",
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user) # new topics cost a generation and are stored for good
+):
+    """
+    Multiple-choice quiz for a topic, sampled from the quiz bank (generated on the first request
+    for a topic).
+    """
+    level = quiz_bank.normalize_difficulty(difficulty)
+    if level is None:
+        raise HTTPException(status_code=400, detail=f"difficulty must be one of: {', '.join(quiz_bank.DIFFICULTIES)}")
+
+    result = await quiz_bank.get_quiz(db, topic, level)
+    if "error" in result:
+        raise HTTPException(status_code=500, detail=result["error"])
 
     return result
 
 @router.post("/progress")
 async def update_progress(
     update: ProgressUpdate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user)
 ):
     """
@@ -77,38 +108,33 @@ async def update_progress(
     user_id = user.id
     
     # Security Check: Ensure roadmap belongs to user
-    roadmap = db.query(models.Roadmap).filter(models.Roadmap.id == update.roadmap_id).first()
+    roadmap = await db.get(models.Roadmap, update.roadmap_id)
     if not roadmap:
         raise HTTPException(status_code=404, detail="Roadmap not found")
     if roadmap.user_id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to update progress for this roadmap")
 
-    progress = db.query(models.TopicProgress).filter(
-        models.TopicProgress.user_id == user_id,
-        models.TopicProgress.roadmap_id == update.roadmap_id,
-        models.TopicProgress.module_index == update.module_index,
-        models.TopicProgress.topic_index == update.topic_index
-    ).first()
-
-    if progress:
-        progress.is_completed = update.is_completed
-    else:
-        progress = models.TopicProgress(
-            user_id=user_id,
-            roadmap_id=update.roadmap_id,
-            module_index=update.module_index,
-            topic_index=update.topic_index,
-            is_completed=update.is_completed
-        )
-        db.add(progress)
-    
-    db.commit()
+    # Single-statement upsert on the (user, roadmap, module, topic) unique index
+    stmt = upsert_insert(models.TopicProgress).values(
+        user_id=user_id,
+        roadmap_id=update.roadmap_id,
+        module_index=update.module_index,
+        topic_index=update.topic_index,
+        is_completed=update.is_completed,
+        created_at=datetime.datetime.utcnow()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "roadmap_id", "module_index", "topic_index"],
+        set_={"is_completed": stmt.excluded.is_completed}
+    )
+    await db.execute(stmt)
+    await db.commit()
     return {"status": "success", "is_completed": update.is_completed}
 
 @router.get("/progress/{roadmap_id}")
 async def get_roadmap_progress(
     roadmap_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user)
 ):
     """
@@ -117,15 +143,15 @@ async def get_roadmap_progress(
     user_id = user.id
     
     # Security Check: Ensure roadmap belongs to user
-    roadmap = db.query(models.Roadmap).filter(models.Roadmap.id == roadmap_id).first()
+    roadmap = await db.get(models.Roadmap, roadmap_id)
     if not roadmap:
          raise HTTPException(status_code=404, detail="Roadmap not found")
     if roadmap.user_id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to view progress for this roadmap")
 
-    progress_records = db.query(models.TopicProgress).filter(
+    progress_records = (await db.execute(select(models.TopicProgress).where(
         models.TopicProgress.user_id == user_id,
         models.TopicProgress.roadmap_id == roadmap_id
-    ).all()
+    ))).scalars().all()
     
     return progress_records
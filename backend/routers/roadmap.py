@@ -1,20 +1,60 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
-from database import get_db
-from models import User, Roadmap
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, AsyncSessionLocal
+from models import User, Roadmap, GenerationJob
 from schemas import RoadmapCreate, Roadmap as RoadmapSchema
-from services.ai_service import generate_roadmap
+from services.ai_service import astream_roadmap
+from services.roadmap_service import save_roadmap, find_reusable_roadmap, generate_or_reuse
+from services.job_queue import job_queue, resolve_callback_host, DONE, FAILED
+from services.resume_profile import profile_from_upload
+from services.resume_parser import RESUME_MAX_BYTES, ResumeTooLarge, ResumeParseError, ResumeParseTimeout
 from typing import Optional
+import datetime
+import os
 from pydantic import BaseModel
 from core.limiter import limiter
 
 router = APIRouter()
 
 from fastapi import UploadFile, File, Form
-import pypdf
-import io
+from fastapi.responses import StreamingResponse
 
 from core.security import get_current_user
+from core.sse import sse_event, SSE_HEADERS
+
+MAX_FILE_SIZE = RESUME_MAX_BYTES # 5MB
+# Queued + running generation jobs a single user may have at once
+MAX_ACTIVE_JOBS_PER_USER = int(os.getenv("MAX_ACTIVE_JOBS_PER_USER", "3"))
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str # queued / running / done / failed
+    error: Optional[str] = None
+    roadmap: Optional[RoadmapSchema] = None
+    created_at: Optional[datetime.datetime] = None
+    started_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+
+async def _read_resume_text(file: Optional[UploadFile]) -> str:
+    if not file:
+        return ""
+
+    if file.content_type != "application/pdf":
+         raise HTTPException(status_code=400, detail="Invalid file type. Only PDF allowed.")
+
+    # The body size middleware already stopped anything far over the limit mid-upload
+    if file.size is not None and file.size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail="File too large. Max size is 5MB.")
+
+    try:
+        return await profile_from_upload(file)
+    except ResumeTooLarge:
+        raise HTTPException(status_code=413, detail="File too large. Max size is 5MB.")
+    except ResumeParseTimeout:
+        raise HTTPException(status_code=422, detail="PDF took too long to process. Please upload a simpler file.")
+    except ResumeParseError:
+        raise HTTPException(status_code=400, detail="Failed to read PDF file.")
 
 @router.post("/generate", response_model=RoadmapSchema)
 @limiter.limit("2/minute") # Stricter limit for full roadmap generation
@@ -23,46 +63,17 @@ async def create_roadmap(
     goal: str = Form(...),
     current_skills: Optional[str] = Form(""),
     file: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user)
 ):
     # User is now authenticated via Supabase and synced to local DB
     
-    resume_text = ""
-    MAX_FILE_SIZE = 5 * 1024 * 1024 # 5MB
-    
-    if file:
-        if file.content_type != "application/pdf":
-             raise HTTPException(status_code=400, detail="Invalid file type. Only PDF allowed.")
-        
-        # Check file size (approximate using seek/tell if possible, or read chunks)
-        # For simplicity in FastAPI, we can check headers or read and check len
-        # file.size is not always available, so we read content.
-        
-        try:
-            content = await file.read()
-            if len(content) > MAX_FILE_SIZE:
-                 raise HTTPException(status_code=413, detail="File too large. Max size is 5MB.")
-            
-            pdf_file = io.BytesIO(content)
-            reader = pypdf.PdfReader(pdf_file)
-            for page in reader.pages:
-                resume_text += page.extract_text() + "\n"
-                
-            # Basic sanity check on extracted text length
-            if len(resume_text) > 50000: # Limit resume text to avoid token overflow
-                resume_text = resume_text[:50000]
-                
-        except HTTPException as he:
-            raise he
-        except Exception as e:
-            # print(f"Error reading PDF: {e}")
-            raise HTTPException(status_code=400, detail="Failed to read PDF file.")
-
-    # Call AI Service
-    print(f"DEBUG: calling generate_roadmap for user {user.id} with goal: {goal}")
-    ai_result = generate_roadmap(goal, current_skills, resume_text)
-    print("DEBUG: generate_roadmap returned")
+    resume_text = await _read_resume_text(file)
+
+    # Call AI Service (unless a near-identical request was already generated)
+    print(f"DEBUG: calling agenerate_roadmap for user {user.id} with goal: {goal}")
+    ai_result, source_id = await generate_or_reuse(db, goal, current_skills, resume_text)
+    print("DEBUG: agenerate_roadmap returned" if source_id is None else f"DEBUG: reused roadmap {source_id}")
     
     if "error" in ai_result:
         error_msg = ai_result.get("error", "Failed to generate roadmap")
@@ -71,27 +82,128 @@ async def create_roadmap(
         raise HTTPException(status_code=500, detail=f"{error_msg}: {details}")
 
     # Save to DB
-    # print("DEBUG: Saving roadmap to DB")
-    db_roadmap = Roadmap(
-        title=f"Roadmap to {goal}",
-        description=f"Generated roadmap for {goal}",
-        user_id=user.id,
-        content=ai_result
+    return await save_roadmap(
+        db, user.id, goal, ai_result,
+        current_skills=current_skills, has_resume=bool(resume_text), source_roadmap_id=source_id
+    )
+
+@router.post("/generate/stream")
+@limiter.limit("2/minute")
+async def stream_roadmap(
+    request: Request,
+    goal: str = Form(...),
+    current_skills: Optional[str] = Form(""),
+    file: Optional[UploadFile] = File(None),
+    user: User = Depends(get_current_user)
+):
+    """
+    Same as /generate but streams the generation as Server-Sent Events:
+    `token` (raw output), `module` (each roadmap module once it parses), then
+    `done` with the saved roadmap, or `error`.
+    """
+    resume_text = await _read_resume_text(file)
+    user_id = user.id
+
+    async def reused_events(source):
+        for module in source.content["roadmap"]:
+            yield "module", module
+        yield "done", source.content
+
+    async def event_stream():
+        module_index = 0
+        async with AsyncSessionLocal() as db:
+            source = await find_reusable_roadmap(db, goal, current_skills, resume_text)
+        source_id = source.id if source is not None else None
+        events = reused_events(source) if source is not None else astream_roadmap(goal, current_skills, resume_text)
+        async for event, data in events:
+            if event == "token":
+                yield sse_event("token", {"text": data})
+            elif event == "module":
+                yield sse_event("module", {"index": module_index, "module": data})
+                module_index += 1
+            elif event == "done":
+                # The request-scoped session is gone once streaming starts, so use our own
+                async with AsyncSessionLocal() as db:
+                    db_roadmap = await save_roadmap(
+                        db, user_id, goal, data,
+                        current_skills=current_skills, has_resume=bool(resume_text), source_roadmap_id=source_id
+                    )
+                    payload = RoadmapSchema.model_validate(db_roadmap).model_dump(mode="json")
+                yield sse_event("done", payload)
+            else:
+                yield sse_event("error", data)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.post("/jobs", response_model=JobStatus, status_code=status.HTTP_202_ACCEPTED)
+@limiter.limit("2/minute") # Same budget as /generate: every job is a full generation
+async def queue_roadmap(
+    request: Request,
+    goal: str = Form(...),
+    current_skills: Optional[str] = Form(""),
+    callback_url: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    """
+    Queues roadmap generation and returns a job id right away. Poll GET /jobs/{job_id}
+    (optionally with ?wait=<seconds>), or pass `callback_url` to get the final status POSTed.
+    """
+    if callback_url:
+        try:
+            await resolve_callback_host(callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if await job_queue.active_count(db, user.id) >= MAX_ACTIVE_JOBS_PER_USER:
+        raise HTTPException(status_code=429, detail="Too many roadmap generations in progress. Please wait for one to finish.")
+
+    resume_text = await _read_resume_text(file)
+    job = await job_queue.submit(
+        db, user.id, "roadmap",
+        {"goal": goal, "current_skills": current_skills or "", "resume_text": resume_text},
+        callback_url=callback_url
+    )
+    return JobStatus(job_id=job.id, status=job.status, created_at=job.created_at)
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_roadmap_job(
+    job_id: str,
+    wait: float = 0,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    """Status of a queued generation; includes the roadmap once done. `wait` long-polls up to 30s."""
+    job = await db.get(GenerationJob, job_id)
+    if job is None or job.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if wait > 0 and job.status not in (DONE, FAILED):
+        await job_queue.wait(job_id, min(wait, 30))
+        await db.refresh(job)
+
+    roadmap = None
+    if job.status == DONE and job.result:
+        roadmap = await db.get(Roadmap, job.result.get("roadmap_id"))
+
+    return JobStatus(
+        job_id=job.id,
+        status=job.status,
+        error=job.error,
+        roadmap=roadmap,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at
     )
-    db.add(db_roadmap)
-    db.commit()
-    db.refresh(db_roadmap)
-    # print(f"DEBUG: Roadmap saved with ID: {db_roadmap.id}")
-    
-    return db_roadmap
 
 @router.get("/{roadmap_id}", response_model=RoadmapSchema)
-def read_roadmap(
+async def read_roadmap(
     roadmap_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user)
 ):
-    roadmap = db.query(Roadmap).filter(Roadmap.id == roadmap_id).first()
+    roadmap = await db.get(Roadmap, roadmap_id)
     if roadmap is None:
         raise HTTPException(status_code=404, detail="Roadmap not found")
     
@@ -104,5 +216,5 @@ def read_roadmap(
 from typing import List
 
 @router.get("/", response_model=List[RoadmapSchema])
-def get_user_roadmaps(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    return db.query(Roadmap).filter(Roadmap.user_id == user.id).all()
+async def get_user_roadmaps(db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)):
+    return (await db.execute(select(Roadmap).where(Roadmap.user_id == user.id))).scalars().all()
@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import func, and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 from models import User, Roadmap, TopicProgress, Lesson, UserChallenge
 from core.security import get_current_user
+from services.roadmap_service import backfill_topics
+import datetime
 from pydantic import BaseModel
 from typing import Optional
 
@@ -33,45 +36,56 @@ class UserStats(BaseModel):
 
 @router.get("/stats", response_model=UserStats)
 async def get_user_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user)
 ):
-    # Get all roadmaps for the user
-    roadmaps = db.query(Roadmap).filter(Roadmap.user_id == user.id).order_by(Roadmap.created_at.desc()).all()
-    
-    roadmap_count = len(roadmaps)
+    # One grouped query: every roadmap with its completed-topic count.
+    # Only the columns we need are selected, so the JSON `content` is never loaded.
+    completed_count = func.count(TopicProgress.id)
+    roadmap_rows = (await db.execute(select(
+        Roadmap.id,
+        Roadmap.title,
+        Roadmap.total_topics,
+        completed_count
+    ).outerjoin(
+        TopicProgress,
+        and_(
+            TopicProgress.roadmap_id == Roadmap.id,
+            TopicProgress.user_id == user.id,
+            TopicProgress.is_completed == True
+        )
+    ).where(
+        Roadmap.user_id == user.id
+    ).group_by(
+        Roadmap.id, Roadmap.title, Roadmap.total_topics, Roadmap.created_at
+    ).order_by(Roadmap.created_at.desc()))).all()
+
+    # Roadmaps created before total_topics existed: compute once and store
+    missing_ids = [row.id for row in roadmap_rows if row.total_topics is None]
+    backfilled = await backfill_topics(db, missing_ids) if missing_ids else {}
+
+    roadmap_count = len(roadmap_rows)
     total_completed_lessons = 0
     recent_activity = []
     badges = []
 
-    # Weekly Progress Logic
-    import datetime
+    # Weekly Progress Logic + challenge count, as scalar subqueries in a single round trip
     one_week_ago = datetime.datetime.utcnow() - datetime.timedelta(days=7)
-    weekly_completed = db.query(TopicProgress).filter(
-        TopicProgress.user_id == user.id,
-        TopicProgress.is_completed == True,
-        TopicProgress.created_at >= one_week_ago
-    ).count()
+    weekly_completed, code_challenges = (await db.execute(select(
+        select(func.count(TopicProgress.id)).where(
+            TopicProgress.user_id == user.id,
+            TopicProgress.is_completed == True,
+            TopicProgress.created_at >= one_week_ago
+        ).scalar_subquery(),
+        select(func.count(UserChallenge.id)).where(
+            UserChallenge.user_id == user.id
+        ).scalar_subquery()
+    ))).one()
 
     # Calculate progress for each roadmap
-    for roadmap in roadmaps:
-        # Calculate total topics from JSON content
-        total_topics = 0
-        try:
-            # roadmap.content is stored as a JSON dict
-            content = roadmap.content
-            if content and "roadmap" in content:
-                for module in content["roadmap"]:
-                    total_topics += len(module.get("topics", []))
-        except Exception:
-            total_topics = 0
-
-        # Calculate completed topics from TopicProgress
-        completed_count = db.query(TopicProgress).filter(
-            TopicProgress.user_id == user.id,
-            TopicProgress.roadmap_id == roadmap.id,
-            TopicProgress.is_completed == True
-        ).count()
+    for row in roadmap_rows:
+        total_topics = row.total_topics if row.total_topics is not None else backfilled.get(row.id, 0)
+        completed_count = row[3]
         
         total_completed_lessons += completed_count
         
@@ -83,19 +97,20 @@ async def get_user_stats(
         # We'll just return the top 3 in the main list
         if len(recent_activity) < 5:
             recent_activity.append(RoadmapProgress(
-                id=roadmap.id,
-                title=roadmap.title,
+                id=row.id,
+                title=row.title,
                 progress=progress,
                 total_topics=total_topics,
                 completed_topics=completed_count
             ))
             
         # Derive badges from titles
-        if "react" in roadmap.title.lower() and "React Developer" not in badges:
+        title = (row.title or "").lower()
+        if "react" in title and "React Developer" not in badges:
             badges.append("React Developer")
-        if "python" in roadmap.title.lower() and "Python Enthusiast" not in badges:
+        if "python" in title and "Python Enthusiast" not in badges:
             badges.append("Python Enthusiast")
-        if "javascript" in roadmap.title.lower() and "JS Wizard" not in badges:
+        if "javascript" in title and "JS Wizard" not in badges:
             badges.append("JS Wizard")
 
     # Add Pro Member badge if not present (mock logic)
@@ -130,7 +145,7 @@ async def get_user_stats(
         "items_created": roadmap_count,
         "lessons_completed": total_completed_lessons,
         "skills_mastered": skills_mastered,
-        "code_challenges": db.query(UserChallenge).filter(UserChallenge.user_id == user.id).count(),
+        "code_challenges": code_challenges,
         "streak_days": streak_days,
         "total_xp": total_xp,
         "recent_activity": recent_activity,
@@ -1,9 +1,13 @@
 import os
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
+import asyncio
 from langchain_core.output_parsers import PydanticOutputParser
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from typing import List
+from services.json_stream import RoadmapModuleScanner
+from services.resume_profile import summarize_resume, RESUME_TOKEN_BUDGET
+from core.text import estimate_tokens
+from services import prompts
+from services.llm_client import llm_client, ROADMAP_MODEL, FAST_MODEL
 
 # Define Pydantic models for output structure
 class Resource(BaseModel):
@@ -31,27 +35,34 @@ class RoadmapStructure(BaseModel):
 output_parser = PydanticOutputParser(pydantic_object=RoadmapStructure)
 format_instructions = output_parser.get_format_instructions()
 
-def get_llm(model_name="llama-3.3-70b-versatile"):
+def get_llm(model_name=ROADMAP_MODEL):
+    """The model behind the resilience layer (timeouts, circuit breaker, hedging, 70B -> 8B fallback)."""
     api_key = os.getenv("GROQ_API_KEY")
     if not api_key:
         # print("Warning: GROQ_API_KEY not found in environment variables.")
         return None
-    return ChatGroq(
-        model=model_name,
-        temperature=0.7,
-        api_key=api_key
-    )
+    return llm_client.get(model_name)
 
-# Initialize parser
-output_parser = PydanticOutputParser(pydantic_object=RoadmapStructure)
-format_instructions = output_parser.get_format_instructions()
+# Caps how many Groq calls a single worker has in flight at once (async variants only)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+_llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
 
-def generate_roadmap(goal: str, current_skills: str = "", resume_text: str = ""):
-    llm = get_llm()
-    if not llm:
-        return {"error": "GROQ_API_KEY not set. Please check your backend .env file."}
+async def _ainvoke(llm, messages):
+    async with _llm_semaphore:
+        return await llm.ainvoke(messages)
+
+def prepare_resume(resume_text: str) -> str:
+    """
+    Prompt-ready resume: text already within RESUME_TOKEN_BUDGET (e.g. a profile built
+    at upload time) is used as is, anything longer is compressed first.
+    """
+    if not resume_text or estimate_tokens(resume_text) <= RESUME_TOKEN_BUDGET:
+        return resume_text or ""
+    return summarize_resume(resume_text)
 
-    template = """
+ROADMAP_PROMPT = prompts.register(
+    "roadmap", version=1, model=ROADMAP_MODEL,
+    template="""
     You are an Expert Curriculum Designer and Career Mentor. Create a highly personalized learning roadmap for a user with the following goal: {goal}.
     
     User Profile:
@@ -72,29 +83,203 @@ def generate_roadmap(goal: str, current_skills: str = "", resume_text: str = "")
        - 1-2 PRACTICAL PROJECTS/EXERCISES: Suggest a specific task to practice these skills (e.g., "Refactor your previous Java app into Python").
     
     {format_instructions}
-    """
+    """,
+    partials={"format_instructions": format_instructions}
+)
+
+def _roadmap_messages(goal: str, current_skills: str, resume_text: str):
+    return ROADMAP_PROMPT.messages(
+        goal=goal,
+        current_skills=current_skills,
+        resume_text=prepare_resume(resume_text)
+    )
+
+# Roadmaps are the most expensive call we make, so a malformed or cut-off response is
+# salvaged instead of thrown away: modules that validate are kept, and one repair call
+# regenerates only the broken ones (and continues a truncated array).
+# Any roadmap with a valid module is accepted, as before; raise ROADMAP_MIN_MODULES to have
+# shorter ones extended by the repair call (and rejected if that still falls short)
+ROADMAP_MIN_MODULES = max(1, int(os.getenv("ROADMAP_MIN_MODULES", "1")))
+# Groq JSON mode; not available when streaming
+JSON_MODE = {"type": "json_object"}
+
+ROADMAP_REPAIR_PROMPT = prompts.register(
+    "roadmap_repair", version=1, model=ROADMAP_MODEL,
+    template="""
+    You are an Expert Curriculum Designer and Career Mentor. You were creating a highly personalized learning roadmap for a user with the following goal: {goal}.
     
-    prompt = ChatPromptTemplate.from_template(template)
+    User Profile:
+    - Current Skills/Background: {current_skills}
+    - Resume Analysis: {resume_text}
     
-    messages = prompt.format_messages(
-        goal=goal, 
-        current_skills=current_skills,
-        resume_text=resume_text,
-        format_instructions=format_instructions
+    Part of your previous answer was lost. This is the roadmap outline so far:
+    {outline}
+    
+    TASK: {task}
+    Write them exactly like the other modules: a contextualized description, specific topics, at least 2 FREE resources, at least 1 PAID resource and 1-2 practical projects. Do not repeat modules that are already in the outline.
+    
+    {format_instructions}
+    """,
+    partials={"format_instructions": format_instructions}
+)
+
+def _validated_slots(text: str):
+    """
+    (slots, truncated) for a raw roadmap response: every module in array order as a
+    validated dict, or None where it was broken; truncated if the array never closed.
+    """
+    try:
+        return [m.model_dump() for m in output_parser.parse(text).roadmap], False
+    except Exception:
+        pass
+    scanner = RoadmapModuleScanner()
+    scanner.feed(text)
+    slots = []
+    for raw_module in scanner.slots:
+        try:
+            slots.append(RoadmapModule.model_validate(raw_module).model_dump())
+        except ValidationError:
+            slots.append(None)
+    return slots, not scanner.finished
+
+def _repair_messages(slots: list, truncated: bool, goal: str, current_skills: str, resume_text: str):
+    """Prompt asking for just the missing modules, or None when nothing needs repairing."""
+    missing = sum(1 for slot in slots if slot is None)
+    # Too few modules to use is handled like a cut-off answer: ask for the rest
+    truncated = truncated or len(slots) - missing < ROADMAP_MIN_MODULES
+    if not missing and not truncated:
+        return None
+    if not slots:
+        outline = "(nothing usable yet)"
+        task = "Write the complete roadmap."
+    else:
+        outline = "\n    ".join(
+            f"{i}. {slot['title']}" if slot is not None else f"{i}. MISSING"
+            for i, slot in enumerate(slots, 1)
+        )
+        parts = []
+        if missing:
+            parts.append(f"Write the {missing} module(s) marked MISSING, in outline order")
+        if truncated:
+            parts.append("then continue with the remaining modules needed to reach the goal" if missing
+                         else "The roadmap was cut off: write the remaining modules needed to reach the goal")
+        task = ", ".join(parts) + ". Return ONLY these new modules in the \"roadmap\" array."
+    return ROADMAP_REPAIR_PROMPT.messages(
+        goal=goal, current_skills=current_skills, resume_text=prepare_resume(resume_text),
+        outline=outline, task=task
     )
+
+def _merge_repair(slots: list, truncated: bool, repair_text: str) -> list:
+    """Fills the broken slots (in order) with repaired modules; extra ones extend a truncated (or too short) roadmap."""
+    repaired = iter(slot for slot in _validated_slots(repair_text)[0] if slot is not None)
+    merged = [slot if slot is not None else next(repaired, None) for slot in slots]
+    if truncated or sum(1 for slot in slots if slot is not None) < ROADMAP_MIN_MODULES:
+        merged.extend(repaired)
+    return merged
+
+def _finish_roadmap(slots: list, details: str = "") -> dict:
+    """The roadmap from the modules we have (gaps dropped), if at least ROADMAP_MIN_MODULES survived."""
+    modules = [slot for slot in slots if slot is not None]
+    if len(modules) >= ROADMAP_MIN_MODULES:
+        return {"roadmap": modules}
+    return {
+        "error": "Failed to generate roadmap",
+        "details": details or f"The model returned {len(modules)} usable module(s), at least {ROADMAP_MIN_MODULES} are needed"
+    }
+
+def _failed_generation(e: Exception):
+    """
+    JSON mode rejects output that isn't valid JSON (including a truncated answer) with a 400
+    json_validate_failed error; the rejected text comes back in the error body. None otherwise.
+    """
+    body = getattr(e, "body", None)
+    if isinstance(body, dict):
+        body = body.get("error", body)
+    if isinstance(body, dict) and isinstance(body.get("failed_generation"), str):
+        return body["failed_generation"]
+    return None
+
+async def _ainvoke_json(llm, messages) -> str:
+    """Raw JSON-mode output, whether Groq accepted it or not."""
+    try:
+        return (await _ainvoke(llm.bind(response_format=JSON_MODE), messages)).content
+    except Exception as e:
+        text = _failed_generation(e)
+        if text is None:
+            raise
+        return text
+
+async def _arepair_roadmap(llm, slots: list, truncated: bool, goal: str, current_skills: str, resume_text: str) -> list:
+    repair = _repair_messages(slots, truncated, goal, current_skills, resume_text)
+    if repair is None:
+        return slots
+    print(f"Roadmap response incomplete ({sum(s is None for s in slots)} broken, truncated={truncated}); repairing")
+    try:
+        text = await _ainvoke_json(llm, repair)
+    except Exception as e:
+        print(f"Roadmap repair failed: {e}")
+        return slots
+    return _merge_repair(slots, truncated, text)
+
+async def agenerate_roadmap(goal: str, current_skills: str = "", resume_text: str = ""):
+    """Generates a roadmap; does not block the event loop while Groq responds."""
+    llm = get_llm(ROADMAP_PROMPT.model)
+    if not llm:
+        return {"error": "GROQ_API_KEY not set. Please check your backend .env file."}
+
+    messages = _roadmap_messages(goal, current_skills, resume_text)
     
     try:
-        # print("DEBUG: Invoking LLM...")
-        response = llm.invoke(messages)
-        # print("DEBUG: LLM response received. Parsing...")
-        parsed_output = output_parser.parse(response.content)
-        # print("DEBUG: Parsing successful.")
-        # Convert Pydantic model to dict for API response compatibility
-        return parsed_output.model_dump()
+        text = await _ainvoke_json(llm, messages)
     except Exception as e:
-        # print(f"Error parsing AI response: {e}")
-        # Return a partial response if available, or just the error
         return {"error": "Failed to generate roadmap", "details": str(e)}
+    slots, truncated = _validated_slots(text)
+    slots = await _arepair_roadmap(llm, slots, truncated, goal, current_skills, resume_text)
+    return _finish_roadmap(slots)
+
+async def astream_roadmap(goal: str, current_skills: str = "", resume_text: str = ""):
+    """
+    Streaming variant of agenerate_roadmap. Yields (event, data) tuples:
+    ("token", str) for raw output, ("module", dict) as soon as each RoadmapModule parses,
+    then ("done", dict) with the full roadmap or ("error", dict).
+    Broken or missing modules (including a stream that dies midway) are repaired before "done".
+    """
+    llm = get_llm(ROADMAP_PROMPT.model)
+    if not llm:
+        yield "error", {"error": "GROQ_API_KEY not set. Please check your backend .env file."}
+        return
+
+    messages = _roadmap_messages(goal, current_skills, resume_text)
+    scanner = RoadmapModuleScanner()
+    stream_error = ""
+
+    try:
+        async with _llm_semaphore:
+            async for chunk in llm.astream(messages):
+                text = chunk.content
+                if not text:
+                    continue
+                yield "token", text
+                for raw_module in scanner.feed(text):
+                    try:
+                        module = RoadmapModule.model_validate(raw_module)
+                    except ValidationError:
+                        # Repaired after the stream ends
+                        continue
+                    yield "module", module.model_dump()
+    except Exception as e:
+        stream_error = str(e)
+
+    slots, truncated = _validated_slots(scanner.buffer)
+    if stream_error and not any(slots):
+        yield "error", {"error": "Failed to generate roadmap", "details": stream_error}
+        return
+    slots = await _arepair_roadmap(llm, slots, truncated, goal, current_skills, resume_text)
+    result = _finish_roadmap(slots, stream_error)
+    if "error" in result:
+        yield "error", result
+    else:
+        yield "done", result
 
 # --- Quiz Generation ---
 
@@ -115,13 +300,9 @@ class Quiz(BaseModel):
 quiz_parser = PydanticOutputParser(pydantic_object=Quiz)
 quiz_format_instructions = quiz_parser.get_format_instructions()
 
-def generate_quiz(topic: str, difficulty: str = "Beginner"):
-    # Use faster model for quizzes
-    llm = get_llm(model_name="llama-3.1-8b-instant")
-    if not llm:
-        return {"error": "GROQ_API_KEY not set."}
-
-    template = """
+QUIZ_PROMPT = prompts.register(
+    "quiz", version=1, model=FAST_MODEL,
+    template="""
     You are an expert tutor. Create a short multiple-choice quiz to test the user's knowledge on: {topic}.
     
     Difficulty Level: {difficulty}
@@ -132,22 +313,26 @@ def generate_quiz(topic: str, difficulty: str = "Beginner"):
     3. Include a brief explanation for each option (or at least the correct one).
     
     {format_instructions}
-    """
-    
-    prompt = ChatPromptTemplate.from_template(template)
-    
-    messages = prompt.format_messages(
-        topic=topic,
-        difficulty=difficulty,
-        format_instructions=quiz_format_instructions
-    )
+    """,
+    partials={"format_instructions": quiz_format_instructions}
+)
+
+def _quiz_messages(topic: str, difficulty: str):
+    return QUIZ_PROMPT.messages(topic=topic, difficulty=difficulty)
+
+async def agenerate_quiz(topic: str, difficulty: str = "Beginner"):
+    """Generates a quiz for a topic."""
+    llm = get_llm(model_name=QUIZ_PROMPT.model)
+    if not llm:
+        return {"error": "GROQ_API_KEY not set."}
+
+    messages = _quiz_messages(topic, difficulty)
     
     try:
-        response = llm.invoke(messages)
+        response = await _ainvoke(llm, messages)
         parsed_output = quiz_parser.parse(response.content)
         return parsed_output.model_dump()
     except Exception as e:
-        # print(f"Error parsing Quiz AI response: {e}")
         return {"error": "Failed to generate quiz", "details": str(e)}
 
 # --- Lesson Generation ---
@@ -157,16 +342,7 @@ class LessonContent(BaseModel):
     content_markdown: str = Field(description="Detailed lesson content in Markdown format")
     estimated_time: str = Field(description="Estimated reading/practice time (e.g. '15 mins')")
 
-lesson_parser = PydanticOutputParser(pydantic_object=LessonContent)
-lesson_format_instructions = lesson_parser.get_format_instructions()
-
-def generate_lesson(topic: str, context: str = ""):
-    # Use faster model for lessons
-    llm = get_llm(model_name="llama-3.1-8b-instant")
-    if not llm:
-        return {"error": "GROQ_API_KEY not set."}
-
-    template = """
+LESSON_PROMPT = prompts.register("lesson", version=1, model=FAST_MODEL, template="""
     You are an expert instructor. Create a comprehensive, deep-dive lesson for the topic: {topic}.
     
     Context (Parent Module/Roadmap): {context}
@@ -184,30 +360,96 @@ def generate_lesson(topic: str, context: str = ""):
     
     2. **Tone**: Encouraging, professional, and clear.
     3. **Formatting**: Return ONLY the Markdown content. Do not wrap it in JSON. Use headers, bold text, and code blocks where appropriate.
-    """
-    
-    prompt = ChatPromptTemplate.from_template(template)
+    """)
+
+def _lesson_messages(topic: str, context: str):
+    return LESSON_PROMPT.messages(topic=topic, context=context)
+
+def _lesson_result(topic: str, content: str):
+    # Simple cleanup if the model chats
+    if "Here is the lesson" in content:
+         content = content.split("Here is the lesson")[-1].strip()
     
-    messages = prompt.format_messages(topic=topic, context=context)
+    return {
+        "title": f"Lesson: {topic}",
+        "content_markdown": content,
+        "estimated_time": "15 mins" # Estimate
+    }
+
+def _lesson_failure(topic: str, e: Exception):
+    return {
+        "error": "Failed to generate lesson",
+        "title": f"Lesson: {topic}", 
+        "content_markdown": f"Failed to generate lesson content. Error: {str(e)}",
+        "estimated_time": "0 mins"
+    }
+
+async def agenerate_lesson(topic: str, context: str = ""):
+    """Generates a lesson for a topic."""
+    llm = get_llm(model_name=LESSON_PROMPT.model)
+    if not llm:
+        return {"error": "GROQ_API_KEY not set."}
+
+    messages = _lesson_messages(topic, context)
     
     try:
-        # print(f"DEBUG: Generating lesson for topic: {topic}")
-        response = llm.invoke(messages)
-        content = response.content
-        
-        # Simple cleanup if the model chats
-        if "Here is the lesson" in content:
-             content = content.split("Here is the lesson")[-1].strip()
-        
-        return {
-            "title": f"Lesson: {topic}",
-            "content_markdown": content,
-            "estimated_time": "15 mins" # Estimate
-        }
+        response = await _ainvoke(llm, messages)
+        return _lesson_result(topic, response.content)
     except Exception as e:
-        # print(f"Error generating lesson: {e}")
-        return {
-            "title": f"Lesson: {topic}", 
-            "content_markdown": f"Failed to generate lesson content. Error: {str(e)}",
-            "estimated_time": "0 mins"
-        }
+        return _lesson_failure(topic, e)
+
+async def astream_lesson(topic: str, context: str = ""):
+    """
+    Streaming variant of agenerate_lesson. Yields ("token", str) chunks of markdown,
+    then ("done", dict) with the cleaned-up lesson or ("error", dict).
+    """
+    llm = get_llm(model_name=LESSON_PROMPT.model)
+    if not llm:
+        yield "error", {"error": "GROQ_API_KEY not set."}
+        return
+
+    messages = _lesson_messages(topic, context)
+    parts = []
+
+    try:
+        async with _llm_semaphore:
+            async for chunk in llm.astream(messages):
+                if not chunk.content:
+                    continue
+                parts.append(chunk.content)
+                yield "token", chunk.content
+        yield "done", _lesson_result(topic, "".join(parts))
+    except Exception as e:
+        yield "error", {"error": "Failed to generate lesson", "details": str(e)}
+
+# --- Code review (used by /challenges/verify) ---
+
+CODE_REVIEW_PROMPT = prompts.register(
+    "code_review", version=1, model=ROADMAP_MODEL,
+    system="You are a precise code verification engine. Output valid JSON only.",
+    template="""
+    You are a Senior Code Reviewer and Auto-Grader.
+    
+    Task: Verify if the following code correctly solves the problem.
+    
+    Problem: {title}
+    Description: {description}
+    Test Criteria: {test_criteria}
+    {test_context}
+    User Submitted Code ({language}):
+    ```
+    {code}
+    ```
+    
+    Instructions:
+    1. Check for correctness based on Test Criteria.
+    2. Check for logic errors.
+    3. Ignore minor styling issues unless they break the code.
+    
+    Return ONLY a JSON object in this format, no markdown, no other text:
+    {{
+        "correct": boolean,
+        "feedback": "string (concise explanation or hints if wrong, praise if correct)"
+    }}
+    """
+)
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+
+# Local, deterministic grading of Python submissions.
+# Each submission runs in its own short-lived interpreter inside a sandbox (nsjail or
+# bubblewrap): a dedicated unprivileged uid, no network, no environment, fresh PID
+# namespace and a read-only filesystem that holds nothing but the Python runtime.
+# On top of that come CPU, memory, process and wall-clock limits; at most
+# CODE_RUNNER_MAX_WORKERS run at the same time.
+CODE_RUNNER_MAX_WORKERS = int(os.getenv("CODE_RUNNER_MAX_WORKERS", str(os.cpu_count() or 2)))
+CODE_RUNNER_CPU_SECONDS = int(os.getenv("CODE_RUNNER_CPU_SECONDS", "2"))
+CODE_RUNNER_MEMORY_MB = int(os.getenv("CODE_RUNNER_MEMORY_MB", "256"))
+CODE_RUNNER_WALL_SECONDS = float(os.getenv("CODE_RUNNER_WALL_SECONDS", "5"))
+CODE_RUNNER_MAX_OUTPUT = 64 * 1024
+# Longest output/error echoed back per test case (and stored in the verification cache)
+CODE_RUNNER_MAX_CASE_OUTPUT = int(os.getenv("CODE_RUNNER_MAX_CASE_OUTPUT", "200"))
+# "auto" picks nsjail, then bwrap. "none" runs submissions unsandboxed as the API's own
+# user: only for local development, never with real secrets in the environment.
+CODE_RUNNER_SANDBOX = os.getenv("CODE_RUNNER_SANDBOX", "auto").lower()
+CODE_RUNNER_UID = int(os.getenv("CODE_RUNNER_UID", "65534")) # nobody
+CODE_RUNNER_GID = int(os.getenv("CODE_RUNNER_GID", "65534"))
+# Interpreter to run inside the sandbox; its installation prefix is mounted read-only
+CODE_RUNNER_PYTHON = os.getenv("CODE_RUNNER_PYTHON", os.path.realpath(sys.executable))
+_RUNTIME_PATHS = ("/usr", "/lib", "/lib64", "/bin", sys.base_prefix)
+
+_runner_semaphore = asyncio.Semaphore(CODE_RUNNER_MAX_WORKERS)
+
+# Runs inside the sandboxed interpreter. Limits are applied before any user code executes,
+# soft and hard alike, so the submission cannot raise them again (or fork at all).
+# The submission shares this interpreter, so anything the harness can reach it can reach too.
+# That's why the child only gets the inputs and only reports raw return values: the expected
+# outputs never leave the API process, which is where pass/fail is decided.
+HARNESS = r'''
+import io, json, os, resource, sys, copy, contextlib
+
+def describe(e):
+    message = str(e)
+    return "%s: %s" % (type(e).__name__, message) if message else type(e).__name__
+
+def normalize(value):
+    return json.loads(json.dumps(value, default=repr))
+
+def main():
+    payload = json.loads(sys.stdin.read())
+    results_fd = payload["results_fd"]
+    limits = payload["limits"]
+    resource.setrlimit(resource.RLIMIT_CPU, (limits["cpu"], limits["cpu"]))
+    resource.setrlimit(resource.RLIMIT_AS, (limits["memory"], limits["memory"]))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (16, 16))
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+
+    results = []
+    error = None
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        namespace = {"__name__": "__submission__"}
+        try:
+            exec(compile(payload["code"], "<submission>", "exec"), namespace)
+            func = namespace.get(payload["function"])
+            if not callable(func):
+                raise NameError("Function '%s' is not defined" % payload["function"])
+        except BaseException as e:
+            error = describe(e)
+        if error is None:
+            for args in payload["inputs"]:
+                try:
+                    results.append({"output": normalize(func(*copy.deepcopy(args)))})
+                except BaseException as e:
+                    results.append({"error": describe(e)})
+
+    os.write(results_fd, ("\n" + json.dumps({"error": error, "cases": results}) + "\n").encode())
+
+main()
+'''
+
+
+def _sandbox_tool():
+    """(kind, path) of the sandbox to run submissions in, or None if none is available."""
+    if CODE_RUNNER_SANDBOX == "none":
+        return ("none", None)
+    for kind in ("nsjail", "bwrap"):
+        if CODE_RUNNER_SANDBOX in ("auto", kind):
+            path = shutil.which(kind)
+            if path:
+                return (kind, path)
+    return None
+
+
+_sandbox = _sandbox_tool()
+if _sandbox is None:
+    print("Code runner: no sandbox (nsjail / bwrap) found, local Python grading is disabled")
+elif _sandbox[0] == "none":
+    print("Code runner: CODE_RUNNER_SANDBOX=none, submissions run UNSANDBOXED")
+
+
+def sandbox_available() -> bool:
+    return _sandbox is not None
+
+
+def _command(results_fd: int) -> list:
+    """The interpreter command line, wrapped in the sandbox (which keeps `results_fd` open)."""
+    python = [CODE_RUNNER_PYTHON, "-I", "-S", "-c", HARNESS]
+    kind, tool = _sandbox
+    runtime = sorted({p for p in _RUNTIME_PATHS if os.path.exists(p)})
+    if kind == "nsjail":
+        # New user/pid/net/mount/ipc/uts namespaces by default; no environment is passed on
+        command = [tool, "--mode", "o", "--really_quiet", "--user", str(CODE_RUNNER_UID), "--group", str(CODE_RUNNER_GID),
+                   "--hostname", "sandbox", "--cwd", "/", "--disable_proc", "--time_limit", str(int(CODE_RUNNER_WALL_SECONDS) + 1),
+                   "--pass_fd", str(results_fd)]
+        for path in runtime:
+            command += ["--bindmount_ro", path]
+        return command + ["--"] + python
+    if kind == "bwrap":
+        command = [tool, "--unshare-all", "--die-with-parent", "--new-session", "--clearenv",
+                   "--uid", str(CODE_RUNNER_UID), "--gid", str(CODE_RUNNER_GID), "--cap-drop", "ALL", "--chdir", "/"]
+        for path in runtime:
+            command += ["--ro-bind", path, path]
+        return command + python
+    return python
+
+
+def _matches(output, expected, compare: str) -> bool:
+    if compare == "sorted" and isinstance(output, list) and isinstance(expected, list):
+        return sorted(output, key=repr) == sorted(expected, key=repr)
+    return output == expected
+
+
+def _json_type(value) -> str:
+    if isinstance(value, bool) or value is None:
+        return type(value).__name__
+    if isinstance(value, (int, float)):
+        return "number"
+    return type(value).__name__
+
+
+def _clip(text: str, limit: int = CODE_RUNNER_MAX_CASE_OUTPUT) -> str:
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def _safe_case(case_result: dict, expected, compare: str) -> dict:
+    """
+    Grades one reported result and returns what it may echo back: an output of the expected
+    type and a bounded size (anything else is described, not shown), and a clipped error message.
+    """
+    safe = {"passed": "error" not in case_result and "output" in case_result
+            and _matches(case_result["output"], expected, compare)}
+    if "error" in case_result:
+        safe["error"] = _clip(str(case_result["error"]))
+    if "output" in case_result:
+        output = case_result["output"]
+        limit = max(CODE_RUNNER_MAX_CASE_OUTPUT, 2 * len(json.dumps(expected)))
+        if _json_type(output) != _json_type(expected):
+            safe["output"] = f"<{_json_type(output)}, expected {_json_type(expected)}>"
+        elif len(json.dumps(output)) > limit:
+            safe["output"] = f"<{_json_type(output)} too long to show>"
+        else:
+            safe["output"] = output
+    return safe
+
+
+def _failure(error: str, started: float) -> dict:
+    return {"passed": False, "cases": [], "error": error, "duration_ms": int((time.perf_counter() - started) * 1000)}
+
+
+async def _read_results(reader: asyncio.StreamReader) -> bytes:
+    """Everything written to the results pipe until the child exits, or None past CODE_RUNNER_MAX_OUTPUT."""
+    data = b""
+    while chunk := await reader.read(64 * 1024):
+        if data is not None:
+            data += chunk
+            if len(data) > CODE_RUNNER_MAX_OUTPUT:
+                data = None # keep draining so the child doesn't block on a full pipe
+    return data
+
+
+async def run_python_tests(code: str, function_name: str, test_cases: list, compare: str = "exact") -> dict:
+    """
+    Runs `function_name` from the submitted code against every test case.
+    Returns {"passed": bool, "cases": [{"passed", "input", "expected", "output"|"error"}], "error": str|None, "duration_ms": int}.
+    """
+    started = time.perf_counter()
+    if _sandbox is None:
+        return _failure("The code runner sandbox is not available on this server", started)
+
+    async with _runner_semaphore:
+        started = time.perf_counter()
+        # Results come back on their own pipe; stdout/stderr are the submission's to scribble on
+        read_fd, write_fd = os.pipe()
+        payload = json.dumps({
+            "code": code,
+            "function": function_name,
+            "inputs": [case["input"] for case in test_cases],
+            "results_fd": write_fd,
+            "limits": {"cpu": CODE_RUNNER_CPU_SECONDS, "memory": CODE_RUNNER_MEMORY_MB * 1024 * 1024},
+        }).encode()
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        transport = None
+        with tempfile.TemporaryDirectory(prefix="codeforge-run-") as workdir:
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *_command(write_fd),
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL,
+                    cwd=workdir,
+                    env={},
+                    pass_fds=(write_fd,),
+                    start_new_session=True,
+                )
+            finally:
+                os.close(write_fd)
+            try:
+                transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(read_fd, "rb", 0))
+
+                _, raw = await asyncio.wait_for(
+                    asyncio.gather(proc.communicate(payload), _read_results(reader)), CODE_RUNNER_WALL_SECONDS
+                )
+            except asyncio.TimeoutError:
+                # The whole session, not just the interpreter (the sandbox's PID namespace
+                # takes down anything that called setsid() with it)
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await proc.wait()
+                return _failure(f"Time limit exceeded ({CODE_RUNNER_WALL_SECONDS:g}s)", started)
+            finally:
+                if transport is not None:
+                    transport.close()
+                else:
+                    os.close(read_fd)
+
+    if raw is None:
+        return _failure("Submission output is too large", started)
+    # The harness writes one line at the very end; take the last complete one
+    lines = raw.decode(errors="replace").rstrip("\n").rsplit("\n", 1)
+    if not raw.endswith(b"\n") or not lines[-1]:
+        if proc.returncode and proc.returncode < 0:
+            return _failure("Resource limit exceeded (CPU time or memory)", started)
+        return _failure("Submission crashed before producing a result", started)
+
+    try:
+        result = json.loads(lines[-1])
+        reported = result["cases"]
+        error = result["error"]
+        if not isinstance(reported, list) or not all(isinstance(r, dict) for r in reported):
+            raise TypeError("cases is not a list of objects")
+    except (ValueError, KeyError, TypeError):
+        return _failure("Submission produced an unreadable result", started)
+    cases = [
+        {"input": case["input"], "expected": case["expected"], **_safe_case(case_result, case["expected"], compare)}
+        for case, case_result in zip(test_cases, reported)
+    ]
+    error = _clip(str(error)) if error is not None else None
+    return {
+        "passed": error is None and len(cases) == len(test_cases) and all(c["passed"] for c in cases),
+        "cases": cases,
+        "error": error,
+        "duration_ms": int((time.perf_counter() - started) * 1000),
+    }
+
+
+def summarize_results(run: dict) -> str:
+    """Short human-readable feedback for a test run."""
+    if run["error"] and not run["cases"]:
+        return f"Your code could not be run: {run['error']}"
+    total = len(run["cases"])
+    if run["passed"]:
+        return f"All {total} test cases passed. Great job!"
+    failed = [c for c in run["cases"] if not c["passed"]]
+    first = failed[0]
+    args = ", ".join(json.dumps(a) for a in first["input"])
+    got = first.get("error") or json.dumps(first.get("output"))
+    return (
+        f"{total - len(failed)}/{total} test cases passed. "
+        f"For input ({args}) expected {json.dumps(first['expected'])}, got {got}."
+    )
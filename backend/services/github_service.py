@@ -1,54 +1,362 @@
+import asyncio
+import datetime
+import json
+import os
+import re
 import httpx
+from urllib.parse import quote
 from collections import Counter
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import upsert_insert
+from models import GitHubResponseCache, GitHubRepoScan
 
-GITHUB_API_URL = "https://api.github.com"
+try:
+    import tomllib
+except ImportError: # Python < 3.11
+    tomllib = None
 
-async def analyze_github_user(username: str):
+# Override GITHUB_API_URL to point the scanner at a local fake GitHub.
+# GITHUB_TOKEN raises the rate limit from 60 to 5000 requests/hour.
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+GITHUB_SCAN_CONCURRENCY = int(os.getenv("GITHUB_SCAN_CONCURRENCY", "8"))
+GITHUB_MAX_PAGES = int(os.getenv("GITHUB_MAX_PAGES", "10")) # 100 repos per page
+# Languages below this share of a repo's bytes (build scripts, vendored CSS...) aren't counted as skills
+GITHUB_MIN_LANGUAGE_SHARE = float(os.getenv("GITHUB_MIN_LANGUAGE_SHARE", "0.05"))
+# Postgres (asyncpg) allows at most 32767 bind parameters per statement; bulk upserts are split to fit
+MAX_BIND_PARAMS = 32767
+
+RAW_ACCEPT = "application/vnd.github.raw+json"
+
+NPM_SKILLS = {
+    "react": "React", "next": "Next.js", "vue": "Vue", "nuxt": "Nuxt", "@angular/core": "Angular",
+    "svelte": "Svelte", "express": "Express", "@nestjs/core": "NestJS", "typescript": "TypeScript",
+    "tailwindcss": "Tailwind CSS", "redux": "Redux", "@reduxjs/toolkit": "Redux", "graphql": "GraphQL",
+    "mongoose": "MongoDB", "mongodb": "MongoDB", "prisma": "Prisma", "jest": "Jest", "vite": "Vite",
+    "react-native": "React Native", "socket.io": "Socket.IO",
+}
+PYTHON_SKILLS = {
+    "django": "Django", "fastapi": "FastAPI", "flask": "Flask", "numpy": "NumPy", "pandas": "Pandas",
+    "scikit-learn": "Scikit-Learn", "tensorflow": "TensorFlow", "torch": "PyTorch",
+    "sqlalchemy": "SQLAlchemy", "pytest": "Pytest", "celery": "Celery", "langchain": "LangChain",
+}
+GO_SKILLS = {
+    "github.com/gin-gonic/gin": "Gin", "gorm.io/gorm": "GORM", "github.com/gofiber/fiber": "Fiber",
+}
+
+_REQUIREMENT_NAME = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+_NEXT_LINK = re.compile(r'<([^>]+)>\s*;\s*rel="next"')
+# GitHub logins: alphanumerics and hyphens, 1-39 chars. Anything else ("../user", "x/../orgs/y")
+# would let a request reach other API paths with our token.
+_GITHUB_LOGIN = re.compile(r"^[A-Za-z0-9](?:[A-Za-z0-9-]{0,38})$")
+
+
+def is_valid_login(username: str) -> bool:
+    return bool(_GITHUB_LOGIN.fullmatch(username or ""))
+
+
+def github_headers():
+    headers = {"Accept": "application/vnd.github+json", "User-Agent": "codeforge-ai"}
+    if GITHUB_TOKEN:
+        headers["Authorization"] = f"Bearer {GITHUB_TOKEN}"
+    return headers
+
+
+def _python_skills(names) -> set:
+    skills = {"Python"}
+    for name in names:
+        match = _REQUIREMENT_NAME.match(name)
+        if match:
+            package = match.group(1).lower().replace("_", "-")
+            if package in PYTHON_SKILLS:
+                skills.add(PYTHON_SKILLS[package])
+    return skills
+
+
+def _skills_from_package_json(text: str) -> set:
+    manifest = json.loads(text)
+    skills = {"Node.js"}
+    for section in ("dependencies", "devDependencies", "peerDependencies"):
+        for package in (manifest.get(section) or {}):
+            if package in NPM_SKILLS:
+                skills.add(NPM_SKILLS[package])
+    return skills
+
+
+def _skills_from_requirements(text: str) -> set:
+    return _python_skills(line for line in text.splitlines() if not line.strip().startswith(("#", "-")))
+
+
+def _skills_from_pyproject(text: str) -> set:
+    if tomllib is None:
+        return _python_skills(re.findall(r"[\"']([A-Za-z0-9][A-Za-z0-9._-]*)", text))
+    data = tomllib.loads(text)
+    project = data.get("project", {})
+    names = list(project.get("dependencies", []))
+    for extra in project.get("optional-dependencies", {}).values():
+        names.extend(extra)
+    names.extend(data.get("tool", {}).get("poetry", {}).get("dependencies", {}).keys())
+    return _python_skills(names)
+
+
+def _skills_from_go_mod(text: str) -> set:
+    skills = {"Go"}
+    for module, skill in GO_SKILLS.items():
+        if module in text:
+            skills.add(skill)
+    return skills
+
+
+# Root files that reveal a stack, and how to read them
+MANIFESTS = {
+    "package.json": _skills_from_package_json,
+    "requirements.txt": _skills_from_requirements,
+    "pyproject.toml": _skills_from_pyproject,
+    "go.mod": _skills_from_go_mod,
+    "Dockerfile": lambda text: {"Docker"},
+    "docker-compose.yml": lambda text: {"Docker"},
+}
+# Presence alone is enough for these, so their contents aren't fetched
+PRESENCE_ONLY = {"Dockerfile", "docker-compose.yml"}
+
+
+class ConditionalFetcher:
+    """
+    GETs through the shared client with at most GITHUB_SCAN_CONCURRENCY requests in flight.
+    Responses with an ETag are remembered; the next scan sends If-None-Match and a 304
+    (free against the rate limit) is answered from the stored body.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, owner: str, stored: dict):
+        self.client = client
+        self.owner = owner
+        self.stored = stored # url -> GitHubResponseCache
+        self.updates = {} # url -> row for github_response_cache
+        self.requests = 0
+        self.not_modified = 0
+        self.rate_limit_remaining = None
+        self._semaphore = asyncio.Semaphore(GITHUB_SCAN_CONCURRENCY)
+
+    async def get(self, url: str, accept: str = None):
+        """Returns (status_code, body text, Link header)."""
+        headers = {"Accept": accept} if accept else {}
+        cached = self.stored.get(url)
+        if cached is not None and cached.etag:
+            headers["If-None-Match"] = cached.etag
+
+        try:
+            async with self._semaphore:
+                resp = await self.client.get(url, headers=headers)
+        except httpx.HTTPError as e:
+            print(f"GitHub request failed ({url}): {e!r}")
+            return 0, "", None
+        self.requests += 1
+        self.rate_limit_remaining = resp.headers.get("X-RateLimit-Remaining", self.rate_limit_remaining)
+
+        if resp.status_code == 304 and cached is not None:
+            self.not_modified += 1
+            return 200, cached.body, cached.link
+        if resp.status_code == 200 and resp.headers.get("ETag"):
+            self.updates[url] = {
+                "owner": self.owner,
+                "url": url,
+                "etag": resp.headers["ETag"],
+                "link": resp.headers.get("Link"),
+                "body": resp.text,
+                "fetched_at": datetime.datetime.utcnow(),
+            }
+        return resp.status_code, resp.text, resp.headers.get("Link")
+
+
+def _next_link(link_header: str):
+    match = _NEXT_LINK.search(link_header or "")
+    return match.group(1) if match else None
+
+
+async def _list_repos(fetcher: ConditionalFetcher, username: str):
+    """
+    Public repos of the user, following pagination. Returns (repos, complete);
+    repos is None if even the first page failed.
+    """
+    repos = []
+    url = f"{GITHUB_API_URL}/users/{quote(username, safe='')}/repos?sort=updated&per_page=100"
+    for _ in range(GITHUB_MAX_PAGES):
+        status, body, link = await fetcher.get(url)
+        if status != 200:
+            return (repos or None), False
+        try:
+            page = json.loads(body)
+        except ValueError as e:
+            print(f"GitHub scan: unreadable repo listing for {username}: {e}")
+            return (repos or None), False
+        repos.extend(page)
+        url = _next_link(link)
+        if not url:
+            return repos, True
+    return repos, False
+
+
+async def _scan_repo(fetcher: ConditionalFetcher, repo: dict):
+    """Languages + manifest-derived skills of one repo, or None if it couldn't be read."""
+    base = f"{GITHUB_API_URL}/repos/{repo['full_name']}"
+    (lang_status, lang_body, _), (root_status, root_body, _) = await asyncio.gather(
+        fetcher.get(f"{base}/languages"),
+        fetcher.get(f"{base}/contents/"),
+    )
+    if lang_status != 200:
+        return None
+
+    skills = set()
+    try:
+        languages = json.loads(lang_body)
+        total_bytes = sum(languages.values()) or 1
+        for language, size in languages.items():
+            if size / total_bytes >= GITHUB_MIN_LANGUAGE_SHARE or language == repo.get("language"):
+                skills.add(language)
+
+        # Empty repos have no contents (404); that's still a valid scan
+        root_files = {entry["name"] for entry in json.loads(root_body) if entry.get("type") == "file"} if root_status == 200 else set()
+    except (ValueError, AttributeError, TypeError, KeyError) as e:
+        # A malformed response costs this repo, not the whole scan
+        print(f"GitHub scan: skipping {repo['full_name']}, unreadable response: {e!r}")
+        return None
+    present = [name for name in MANIFESTS if name in root_files]
+    for name in present:
+        if name in PRESENCE_ONLY:
+            skills |= MANIFESTS[name]("")
+
+    to_fetch = [name for name in present if name not in PRESENCE_ONLY]
+    responses = await asyncio.gather(*(fetcher.get(f"{base}/contents/{name}", accept=RAW_ACCEPT) for name in to_fetch))
+    for name, (status, body, _) in zip(to_fetch, responses):
+        if status != 200:
+            continue
+        try:
+            skills |= MANIFESTS[name](body)
+        except (ValueError, AttributeError, TypeError) as e:
+            # tomllib.TOMLDecodeError and json.JSONDecodeError are ValueErrors
+            print(f"GitHub scan: unreadable {name} in {repo['full_name']}: {e}")
+
+    return {"languages": languages, "skills": sorted(skills)}
+
+
+async def analyze_github_user(username: str, client: httpx.AsyncClient = None, db: AsyncSession = None):
     """
     Analyzes a GitHub user's public repositories to determine skills.
-    Returns a set of detected skills/languages.
+    Pages through every repo and reads its languages and manifest files (package.json,
+    requirements.txt, pyproject.toml, go.mod, Dockerfile) concurrently.
+    With a `db`, responses are revalidated with ETags and each repo's result is kept, so a
+    re-analysis only rescans repos pushed to since the last one.
+    Pass the app's shared client to reuse pooled connections; a temporary one is used otherwise.
     """
+    if client is None:
+        async with httpx.AsyncClient(headers=github_headers()) as temp_client:
+            return await analyze_github_user(username, temp_client, db)
+
+    if not is_valid_login(username):
+        return {"error": "Invalid GitHub username"}
+
+    owner = username.lower()
+    stored_responses, stored_scans = {}, {}
+    if db is not None:
+        stored_responses = {
+            row.url: row for row in (await db.execute(
+                select(GitHubResponseCache).where(GitHubResponseCache.owner == owner)
+            )).scalars()
+        }
+        stored_scans = {
+            row.repo: row for row in (await db.execute(
+                select(GitHubRepoScan).where(GitHubRepoScan.owner == owner)
+            )).scalars()
+        }
+
+    fetcher = ConditionalFetcher(client, owner, stored_responses)
+
+    # 1. Fetch Repos
+    repos, complete = await _list_repos(fetcher, username)
+    if repos is None:
+        return {"error": "User not found or API limit reached"}
+
     detected_skills = set()
-    
-    async with httpx.AsyncClient() as client:
-        # 1. Fetch Repos
-        resp = await client.get(f"{GITHUB_API_URL}/users/{username}/repos?sort=updated&per_page=10")
-        
-        if resp.status_code != 200:
-            return {"error": "User not found or API limit reached"}
-            
-        repos = resp.json()
-        
-        languages = Counter()
-        
-        # 2. Analyze top 10 repos
-        for repo in repos:
-            # Primary Language
-            if repo.get("language"):
-                languages[repo["language"]] += 1
-                detected_skills.add(repo["language"])
-                
-            # Check topics (if user added them)
-            topics = repo.get("topics", [])
-            for topic in topics:
-                detected_skills.add(topic.lower())
-                
-            # Deep Scan: Check for specific framework files (simplified)
-            # In a real app, we'd fetch the file tree
-            repo_name = repo["name"]
-            
-            # Simple heuristic based on name/description
-            desc = (repo.get("description") or "").lower()
-            if "react" in desc or "nextjs" in desc:
-                detected_skills.add("React")
-            if "django" in desc or "fastapi" in desc:
-                detected_skills.add("Python Frameworks")
-            if "docker" in desc:
-                detected_skills.add("Docker")
+    languages = Counter()
+    to_scan = []
+    results = {}
+
+    # 2. Cheap signals from the listing; deep scan only for repos that changed
+    for repo in repos:
+        if repo.get("language"):
+            languages[repo["language"]] += 1
+            detected_skills.add(repo["language"])
+
+        # Check topics (if user added them)
+        for topic in repo.get("topics", []):
+            detected_skills.add(topic.lower())
+
+        # Forks mostly contain other people's code
+        if repo.get("fork"):
+            continue
+        previous = stored_scans.get(repo["name"])
+        if previous is not None and previous.pushed_at == repo.get("pushed_at"):
+            results[repo["name"]] = {"languages": previous.languages, "skills": previous.skills}
+        else:
+            to_scan.append(repo)
+
+    scanned = await asyncio.gather(*(_scan_repo(fetcher, repo) for repo in to_scan))
+    for repo, result in zip(to_scan, scanned):
+        if result is not None:
+            results[repo["name"]] = result
+
+    for result in results.values():
+        detected_skills.update(result["skills"] or [])
+
+    if db is not None:
+        await _store_scan(db, owner, fetcher, repos if complete else None, to_scan, results)
 
     return {
         "username": username,
         "repo_count": len(repos),
-        "detected_skills": list(detected_skills),
-        "top_languages": languages.most_common(3)
+        "detected_skills": sorted(detected_skills),
+        "top_languages": languages.most_common(3),
+        "rescanned_repos": sum(1 for repo in to_scan if repo["name"] in results),
+        "api_requests": fetcher.requests,
+        "not_modified": fetcher.not_modified,
+        "rate_limit_remaining": fetcher.rate_limit_remaining,
     }
+
+
+async def _upsert_rows(db: AsyncSession, model, rows: list, index_elements: list, update_columns):
+    """Multi-row upsert in as many statements as needed to stay under MAX_BIND_PARAMS."""
+    if not rows:
+        return
+    batch = max(1, MAX_BIND_PARAMS // len(rows[0]))
+    for start in range(0, len(rows), batch):
+        stmt = upsert_insert(model).values(rows[start:start + batch])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={column: stmt.excluded[column] for column in update_columns}
+        ))
+
+
+async def _store_scan(db: AsyncSession, owner: str, fetcher: ConditionalFetcher, repos, scanned: list, results: dict):
+    """Writes ETag responses and per-repo results back in a few bulk statements. `repos` is None for a partial listing."""
+    now = datetime.datetime.utcnow()
+    await _upsert_rows(db, GitHubResponseCache, list(fetcher.updates.values()), ["url"], ("etag", "link", "body", "fetched_at"))
+
+    scan_rows = [
+        {
+            "owner": owner,
+            "repo": repo["name"],
+            "pushed_at": repo.get("pushed_at"),
+            "languages": results[repo["name"]]["languages"],
+            "skills": results[repo["name"]]["skills"],
+            "scanned_at": now,
+        }
+        for repo in scanned if repo["name"] in results
+    ]
+    await _upsert_rows(db, GitHubRepoScan, scan_rows, ["owner", "repo"], ("pushed_at", "languages", "skills", "scanned_at"))
+
+    # Repos that were deleted (or made private) since the last scan; only known from a full listing
+    if repos is not None:
+        current = [repo["name"] for repo in repos]
+        await db.execute(delete(GitHubRepoScan).where(GitHubRepoScan.owner == owner, GitHubRepoScan.repo.not_in(current)))
+    await db.commit()
@@ -0,0 +1,259 @@
+import asyncio
+import datetime
+import ipaddress
+import os
+import socket
+import uuid
+import httpx
+from urllib.parse import urlparse
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from models import GenerationJob
+from core.http import create_async_client
+
+# In-process worker pool for long generations. Job state lives in `generation_jobs`,
+# so any worker process can answer status polls, and queued jobs survive restarts.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# A job still "running" this long after it started belongs to a dead process; requeue it
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "900"))
+JOB_CALLBACK_TIMEOUT = float(os.getenv("JOB_CALLBACK_TIMEOUT", "10"))
+# Long-polls re-check the job row this often (it may be running in another process)
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+# Comma-separated hosts webhooks may target. When empty, any host that resolves only to
+# public addresses is allowed (loopback, private, link-local and reserved ones never are).
+JOB_CALLBACK_ALLOWED_HOSTS = {h.strip().lower() for h in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if h.strip()}
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+class JobFailed(Exception):
+    """Raised by a handler for an expected failure; the message is shown to the client."""
+
+
+def _public_ip(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def validate_callback_url(url: str) -> str:
+    """Cheap checks at submit time: scheme, allowlist, and no literal internal IPs."""
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("callback_url must be an http(s) URL")
+    host = parsed.hostname.lower()
+    if JOB_CALLBACK_ALLOWED_HOSTS:
+        if host not in JOB_CALLBACK_ALLOWED_HOSTS:
+            raise ValueError("callback_url host is not allowed")
+        return url
+    try:
+        ipaddress.ip_address(host.split("%", 1)[0])
+    except ValueError:
+        # A host name: checked once resolved (resolve_callback_host)
+        return url
+    if not _public_ip(host):
+        raise ValueError("callback_url must point to a public address")
+    return url
+
+
+async def resolve_callback_host(url: str):
+    """
+    Raises ValueError unless the callback host is allowlisted or every address it resolves
+    to is public. Runs right before each POST, so DNS changed after submit is caught too.
+    """
+    validate_callback_url(url)
+    parsed = urlparse(url)
+    if JOB_CALLBACK_ALLOWED_HOSTS:
+        return
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise ValueError("callback_url host does not resolve")
+    if not infos or not all(_public_ip(info[4][0]) for info in infos):
+        raise ValueError("callback_url must point to a public address")
+
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self._handlers = {}
+        self._transient = {} # kind -> params dropped once the job finishes
+        self._queue = None
+        self._tasks = []
+        self._finished = {} # job_id -> asyncio.Event, for jobs queued by this process
+        self._client = None
+
+    def register(self, kind: str, handler, transient_params: tuple = ()):
+        """
+        `handler(db, user_id, params) -> dict` becomes the job's result. `transient_params`
+        (e.g. personal data) are removed from the stored params once the job is done or failed.
+        """
+        self._handlers[kind] = handler
+        self._transient[kind] = tuple(transient_params)
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._client = create_async_client(timeout=JOB_CALLBACK_TIMEOUT)
+        await self._recover()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def active_count(self, db: AsyncSession, user_id: int) -> int:
+        return (await db.execute(
+            select(func.count(GenerationJob.id)).where(
+                GenerationJob.user_id == user_id,
+                GenerationJob.status.in_(ACTIVE_STATUSES)
+            )
+        )).scalar()
+
+    async def submit(self, db: AsyncSession, user_id: int, kind: str, params: dict, callback_url: str = None) -> GenerationJob:
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        job = GenerationJob(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            kind=kind,
+            status=QUEUED,
+            params=params,
+            callback_url=callback_url,
+            created_at=datetime.datetime.utcnow()
+        )
+        db.add(job)
+        await db.commit()
+        self._finished[job.id] = asyncio.Event()
+        self._queue.put_nowait(job.id)
+        return job
+
+    async def wait(self, job_id: str, timeout: float):
+        """
+        Long-poll helper: returns once the job finishes, or after `timeout`. Jobs run by this
+        process wake it right away; ones claimed by another process are seen by polling the row.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (remaining := deadline - loop.time()) > 0:
+            step = min(remaining, JOB_POLL_SECONDS)
+            event = self._finished.get(job_id)
+            if event is not None:
+                try:
+                    await asyncio.wait_for(event.wait(), step)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(step)
+            async with AsyncSessionLocal() as db:
+                status = (await db.execute(select(GenerationJob.status).where(GenerationJob.id == job_id))).scalar()
+            if status not in ACTIVE_STATUSES:
+                return
+
+    async def _recover(self):
+        stale_before = datetime.datetime.utcnow() - datetime.timedelta(seconds=JOB_STALE_SECONDS)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.status == RUNNING, GenerationJob.started_at < stale_before)
+                .values(status=QUEUED, started_at=None)
+            )
+            await db.commit()
+            job_ids = (await db.execute(
+                select(GenerationJob.id).where(GenerationJob.status == QUEUED).order_by(GenerationJob.created_at)
+            )).scalars().all()
+        for job_id in job_ids:
+            self._finished[job_id] = asyncio.Event()
+            self._queue.put_nowait(job_id)
+        if job_ids:
+            print(f"Job queue: resumed {len(job_ids)} queued job(s)")
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job {job_id} crashed the worker: {e!r}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        async with AsyncSessionLocal() as db:
+            # Claim atomically: other processes may have picked up the same queued job
+            claimed = await db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id, GenerationJob.status == QUEUED)
+                .values(status=RUNNING, started_at=datetime.datetime.utcnow())
+            )
+            await db.commit()
+            if claimed.rowcount != 1:
+                # Another process has it; waiters here fall back to polling the row
+                self._finished.pop(job_id, None)
+                return
+            job = await db.get(GenerationJob, job_id)
+            handler = self._handlers.get(job.kind)
+
+            try:
+                if handler is None:
+                    raise JobFailed(f"Unknown job kind '{job.kind}'")
+                job.result = await handler(db, job.user_id, job.params or {})
+                job.status = DONE
+            except asyncio.CancelledError:
+                # Shutting down: put it back so the next start picks it up
+                await asyncio.shield(self._discard_changes(db, job))
+                job.status, job.started_at = QUEUED, None
+                await asyncio.shield(db.commit())
+                raise
+            except JobFailed as e:
+                await self._discard_changes(db, job)
+                job.status, job.error = FAILED, str(e)
+            except Exception as e:
+                print(f"Job {job_id} failed: {e!r}")
+                # A DB error leaves the session needing a rollback, or the commit below fails too
+                await self._discard_changes(db, job)
+                job.status, job.error = FAILED, "Generation failed. Please try again."
+            job.finished_at = datetime.datetime.utcnow()
+            transient = self._transient.get(job.kind, ())
+            if job.params and any(key in job.params for key in transient):
+                job.params = {k: v for k, v in job.params.items() if k not in transient}
+            await db.commit()
+
+        event = self._finished.pop(job_id, None)
+        if event is not None:
+            event.set()
+        if job.callback_url:
+            await self._callback(job)
+
+    async def _discard_changes(self, db: AsyncSession, job: GenerationJob):
+        """Rolls back whatever the handler left in the session and reloads the job row."""
+        await db.rollback()
+        await db.refresh(job)
+
+    async def _callback(self, job: GenerationJob):
+        payload = {"job_id": job.id, "status": job.status, "result": job.result, "error": job.error}
+        try:
+            await resolve_callback_host(job.callback_url)
+        except ValueError as e:
+            print(f"Job {job.id} callback refused: {e}")
+            return
+        try:
+            resp = await self._client.post(job.callback_url, json=payload, follow_redirects=False)
+            if resp.status_code >= 400:
+                print(f"Job {job.id} callback returned {resp.status_code}")
+        except httpx.HTTPError as e:
+            print(f"Job {job.id} callback failed: {e!r}")
+
+
+job_queue = JobQueue()
@@ -0,0 +1,72 @@
+import json
+import re
+
+ROADMAP_ARRAY_PATTERN = re.compile(r'"roadmap"\s*:\s*\[')
+
+
+class RoadmapModuleScanner:
+    """
+    Incrementally scans streamed LLM output for the `"roadmap": [...]` array and
+    hands back each module object as soon as its closing brace arrives.
+
+    feed() returns the list of newly completed module dicts (raw JSON, not validated).
+    `slots` keeps every object seen so far in array order, with None for ones that
+    weren't valid JSON, and `finished` tells whether the array was closed.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = None  # index in buffer we've scanned up to (None until the array is found)
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.obj_start = None
+        self.finished = False
+        self.slots = []
+
+    def feed(self, chunk: str) -> list:
+        self.buffer += chunk
+        if self.finished:
+            return []
+
+        if self.pos is None:
+            match = ROADMAP_ARRAY_PATTERN.search(self.buffer)
+            if not match:
+                return []
+            self.pos = match.end()
+
+        completed = []
+        buf = self.buffer
+        i = self.pos
+        while i < len(buf):
+            ch = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                if self.depth == 0 and ch == "{":
+                    self.obj_start = i
+                self.depth += 1
+            elif ch in "}]":
+                if self.depth == 0:
+                    # closing bracket of the roadmap array itself
+                    self.finished = True
+                    i += 1
+                    break
+                self.depth -= 1
+                if self.depth == 0 and self.obj_start is not None:
+                    try:
+                        completed.append(json.loads(buf[self.obj_start:i + 1]))
+                        self.slots.append(completed[-1])
+                    except json.JSONDecodeError:
+                        self.slots.append(None)
+                    self.obj_start = None
+            i += 1
+        self.pos = i
+        return completed
@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from sqlalchemy import or_, and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import User
+
+# Cached top-N snapshot of the leaderboard. XP awards update it in place
+# (record_xp); a full reload only happens every LEADERBOARD_REFRESH_SECONDS so
+# awards made on other workers show up eventually.
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", "100"))
+LEADERBOARD_REFRESH_SECONDS = float(os.getenv("LEADERBOARD_REFRESH_SECONDS", "300"))
+
+# Ranking order: most XP first, earlier account first on ties.
+RANK_ORDER = (User.total_xp.desc(), User.id.asc())
+
+
+def _entry(user) -> dict:
+    total_xp = user.total_xp or 0
+    # Determine badges (mock logic or derived from simple rules for now)
+    badges = []
+    if total_xp > 1000:
+        badges.append("Pro")
+    if user.github_username:
+        badges.append("Coder")
+
+    # Use email or full_name (if available) as username
+    display_name = user.full_name or (user.email or "").split("@")[0]
+    if user.github_username:
+        display_name = user.github_username
+
+    return {"user_id": user.id, "username": display_name, "total_xp": total_xp, "badges": badges}
+
+
+def _sort_key(entry: dict):
+    return (-entry["total_xp"], entry["user_id"])
+
+
+class Leaderboard:
+    def __init__(self, size: int = LEADERBOARD_SIZE, refresh_seconds: float = LEADERBOARD_REFRESH_SECONDS):
+        self.size = size
+        self.refresh_seconds = refresh_seconds
+        self._entries = []
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    async def _ensure_loaded(self, db: AsyncSession):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return
+        users = (await db.execute(select(User).order_by(*RANK_ORDER).limit(self.size))).scalars().all()
+        with self._lock:
+            self._entries = [_entry(u) for u in users]
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    async def page(self, db: AsyncSession, offset: int = 0, limit: int = 10) -> list:
+        """Ranked entries [offset, offset + limit). Served from the snapshot when it covers the page."""
+        await self._ensure_loaded(db)
+        if offset + limit <= self.size:
+            with self._lock:
+                window = self._entries[offset:offset + limit]
+        else:
+            users = (await db.execute(select(User).order_by(*RANK_ORDER).offset(offset).limit(limit))).scalars().all()
+            window = [_entry(u) for u in users]
+        return [dict(entry, rank=offset + i + 1) for i, entry in enumerate(window)]
+
+    async def rank_of(self, db: AsyncSession, user: User) -> dict:
+        """The user's own entry with rank, without scanning the users table."""
+        await self._ensure_loaded(db)
+        with self._lock:
+            for i, entry in enumerate(self._entries):
+                if entry["user_id"] == user.id:
+                    return dict(entry, rank=i + 1)
+
+        # Outside the snapshot: count who ranks ahead using the (total_xp DESC, id) index
+        total_xp = user.total_xp or 0
+        ahead = (await db.execute(select(func.count(User.id)).where(
+            or_(
+                User.total_xp > total_xp,
+                and_(User.total_xp == total_xp, User.id < user.id)
+            )
+        ))).scalar()
+        return dict(_entry(user), rank=ahead + 1)
+
+    def record_xp(self, user: User):
+        """
+        Incrementally applies a user's new XP / profile to the snapshot.
+        XP only grows, so a user either moves up inside the snapshot, enters it
+        by pushing out the last entry, or stays below the cut-off.
+        """
+        if self._loaded_at is None:
+            return
+        entry = _entry(user)
+        with self._lock:
+            entries = [e for e in self._entries if e["user_id"] != user.id]
+            was_listed = len(entries) != len(self._entries)
+            if not was_listed and len(entries) >= self.size and _sort_key(entry) > _sort_key(entries[-1]):
+                return
+            entries.append(entry)
+            entries.sort(key=_sort_key)
+            self._entries = entries[:self.size]
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,117 @@
+import asyncio
+import itertools
+import os
+import time
+from database import AsyncSessionLocal
+from services import lesson_service
+
+# Generates the lessons of a new roadmap in the background, so opening a topic for the
+# first time is a cache hit instead of a multi-second LLM call. Earlier modules go first
+# (across all queued roadmaps), and starts are spaced to stay inside Groq's rate limits.
+LESSON_PREFETCH_ENABLED = os.getenv("LESSON_PREFETCH_ENABLED", "true").lower() == "true"
+LESSON_PREFETCH_WORKERS = int(os.getenv("LESSON_PREFETCH_WORKERS", "2"))
+LESSON_PREFETCH_RPM = float(os.getenv("LESSON_PREFETCH_RPM", "20")) # LLM calls per minute, all workers
+LESSON_PREFETCH_MAX_PER_ROADMAP = int(os.getenv("LESSON_PREFETCH_MAX_PER_ROADMAP", "100"))
+LESSON_PREFETCH_MAX_QUEUE = int(os.getenv("LESSON_PREFETCH_MAX_QUEUE", "2000"))
+# Pause after a failed generation (usually Groq rate limiting) before starting another
+LESSON_PREFETCH_BACKOFF_SECONDS = float(os.getenv("LESSON_PREFETCH_BACKOFF_SECONDS", "30"))
+
+
+def lesson_context(roadmap_title: str, module_title: str) -> str:
+    """The context the learn page sends with each lesson request."""
+    return f"{roadmap_title} - {module_title}"
+
+
+class LessonPrefetcher:
+    def __init__(self, workers: int = LESSON_PREFETCH_WORKERS, rpm: float = LESSON_PREFETCH_RPM):
+        self.workers = workers
+        self.min_interval = 60.0 / rpm if rpm > 0 else 0.0
+        self._queue = asyncio.PriorityQueue(maxsize=LESSON_PREFETCH_MAX_QUEUE)
+        self._pending = set()
+        self._tasks = []
+        self._sequence = itertools.count()
+        self._next_start = 0.0
+        self.generated = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def enqueue_roadmap(self, roadmap_title: str, content: dict):
+        """Queues every topic of a roadmap; (module, topic) position is the priority."""
+        if not LESSON_PREFETCH_ENABLED:
+            return
+        modules = (content or {}).get("roadmap") or []
+        queued = 0
+        for m_index, module in enumerate(modules):
+            context = lesson_context(roadmap_title, str(module.get("title", "")))
+            for t_index, topic in enumerate(module.get("topics", [])):
+                if queued >= LESSON_PREFETCH_MAX_PER_ROADMAP:
+                    return
+                key = lesson_service.lesson_key(str(topic), context)
+                if key is None or key in self._pending:
+                    continue
+                try:
+                    # seq breaks ties FIFO, so roadmaps take turns module by module
+                    self._queue.put_nowait(((m_index, t_index, next(self._sequence)), str(topic), context, key))
+                except asyncio.QueueFull:
+                    return
+                self._pending.add(key)
+                queued += 1
+
+    async def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _throttle(self):
+        """Spaces LLM call starts min_interval apart across all workers."""
+        now = time.monotonic()
+        start = max(now, self._next_start)
+        self._next_start = start + self.min_interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def _worker(self):
+        while True:
+            _, topic, context, key = await self._queue.get()
+            try:
+                # Already in the lessons table (or cached): nothing to spend a call on.
+                # Short session so no connection is held while throttled.
+                async with AsyncSessionLocal() as db:
+                    cached = await lesson_service.find_lesson(db, topic, context)
+                if cached is not None:
+                    self.skipped += 1
+                    continue
+                await self._throttle()
+                async with AsyncSessionLocal() as db:
+                    # Shares the single flight with a user who opens this topic meanwhile
+                    result = await lesson_service.get_or_generate_lesson(db, topic, context)
+                if "error" in result:
+                    self._failed(topic, result["error"])
+                else:
+                    self.generated += 1
+            except Exception as e:
+                self._failed(topic, e)
+            finally:
+                self._pending.discard(key)
+                self._queue.task_done()
+
+    def _failed(self, topic: str, error):
+        self.failed += 1
+        self._next_start = max(self._next_start, time.monotonic() + LESSON_PREFETCH_BACKOFF_SECONDS)
+        print(f"Lesson prefetch failed for {topic!r}: {error}")
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "generated": self.generated,
+            "skipped": self.skipped,
+            "failed": self.failed,
+        }
+
+
+lesson_prefetcher = LessonPrefetcher()
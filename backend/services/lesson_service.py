@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import os
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from models import Lesson
+from core.cache import TTLCache
+from core.singleflight import SingleFlight
+from core.text import normalize_topic
+from services import ai_service
+
+# Lessons are shared by everyone, so they are cached at three levels:
+# in-process hot tier -> `lessons` table (by normalized key) -> one LLM call per key at a time.
+LESSON_CACHE_SIZE = int(os.getenv("LESSON_CACHE_SIZE", "512"))
+LESSON_CACHE_TTL = float(os.getenv("LESSON_CACHE_TTL", "3600"))
+
+_hot_cache = TTLCache(maxsize=LESSON_CACHE_SIZE, ttl=LESSON_CACHE_TTL)
+_generation_flight = SingleFlight()
+
+
+def lesson_key(topic: str, context: str = ""):
+    """Cache key for (topic, context), or None for a topic with nothing to key on (never cached)."""
+    if not normalize_topic(topic):
+        return None
+    raw = normalize_topic(topic) + "\x00" + normalize_topic(context)
+    # Lessons from the first prompt version predate versioned keys; later versions get their own
+    if ai_service.LESSON_PROMPT.version > 1:
+        raw += "\x00" + ai_service.LESSON_PROMPT.id
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def lesson_payload(lesson: Lesson) -> dict:
+    return {
+        "title": lesson.title,
+        "content_markdown": lesson.content_markdown,
+        "estimated_time": lesson.estimated_time
+    }
+
+
+async def find_lesson(db: AsyncSession, topic: str, context: str = ""):
+    """Returns the cached lesson payload for (topic, context), or None."""
+    key = lesson_key(topic, context)
+    if key is None:
+        return None
+    cached = _hot_cache.get(key)
+    if cached is not None:
+        return cached
+
+    lesson = (await db.execute(select(Lesson).where(Lesson.cache_key == key).limit(1))).scalars().first()
+    if lesson is None:
+        # Rows saved before cache keys existed
+        lesson = (await db.execute(
+            select(Lesson).where(Lesson.topic == topic, Lesson.context == context).limit(1)
+        )).scalars().first()
+    if lesson is None:
+        return None
+
+    payload = lesson_payload(lesson)
+    _hot_cache.set(key, payload)
+    return payload
+
+
+async def save_lesson(db: AsyncSession, topic: str, context: str, result: dict):
+    """Stores a generated lesson; topics without a cache key are not stored (returns None)."""
+    key = lesson_key(topic, context)
+    if key is None:
+        return None
+    new_lesson = Lesson(
+        topic=topic,
+        context=context,
+        cache_key=key,
+        title=result.get("title", f"Lesson: {topic}"),
+        content_markdown=result.get("content_markdown", ""),
+        estimated_time=result.get("estimated_time", "10 mins")
+    )
+    db.add(new_lesson)
+    await db.commit()
+    _hot_cache.set(key, lesson_payload(new_lesson))
+    return new_lesson
+
+
+async def get_or_generate_lesson(db: AsyncSession, topic: str, context: str = "") -> dict:
+    """
+    Returns the lesson for (topic, context), generating it on a miss.
+    Concurrent misses for the same normalized key share one LLM call.
+    Failed generations are returned (with an "error" key) but never stored.
+    """
+    cached = await find_lesson(db, topic, context)
+    if cached is not None:
+        return cached
+
+    key = lesson_key(topic, context)
+    if key is None:
+        # Nothing to key a shared lesson on: generate it for this request only
+        return await ai_service.agenerate_lesson(topic, context)
+
+    async def generate():
+        result = await ai_service.agenerate_lesson(topic, context)
+        if "error" not in result:
+            await _store_generated(key, topic, context, result)
+        return result
+
+    return await _generation_flight.do(key, generate)
+
+
+async def _store_generated(key: str, topic: str, context: str, result: dict):
+    # Own session: the flight outlives whichever request happened to start it
+    async with AsyncSessionLocal() as flight_db:
+        # Another worker may have stored it while we were generating
+        existing = (await flight_db.execute(select(Lesson.id).where(Lesson.cache_key == key).limit(1))).first()
+        if existing is None:
+            await save_lesson(flight_db, topic, context, result)
+
+
+async def stream_lesson(topic: str, context: str = ""):
+    """
+    Streaming variant of get_or_generate_lesson for cache misses: yields ("token", str) chunks,
+    then ("done", dict) or ("error", dict). Shares the generation flight with /lesson, so a
+    request that arrives while the same lesson is being generated waits for it and only gets `done`.
+    """
+    key = lesson_key(topic, context)
+    if key is None:
+        async for event in ai_service.astream_lesson(topic, context):
+            yield event
+        return
+
+    if key in _generation_flight:
+        result = await _generation_flight.do(key, None)
+        yield ("error" if "error" in result else "done"), result
+        return
+
+    tokens = asyncio.Queue()
+
+    async def generate():
+        result = {"error": "Failed to generate lesson"}
+        try:
+            async for event, data in ai_service.astream_lesson(topic, context):
+                if event == "token":
+                    tokens.put_nowait(data)
+                else:
+                    result = data
+        finally:
+            tokens.put_nowait(None)
+        if "error" not in result:
+            await _store_generated(key, topic, context, result)
+        return result
+
+    # The flight keeps running (and still stores the lesson) if this client goes away mid-stream
+    flight = _generation_flight.start(key, generate)
+    while (text := await tokens.get()) is not None:
+        yield "token", text
+    result = await asyncio.shield(flight)
+    yield ("error" if "error" in result else "done"), result
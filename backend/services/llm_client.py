@@ -0,0 +1,358 @@
+import asyncio
+import os
+import time
+from collections import deque
+import groq
+from langchain_groq import ChatGroq
+
+# Every Groq call goes through here, so a slow or failing upstream makes requests fail
+# (or degrade) fast instead of piling onto it: each model has its own timeout and circuit
+# breaker, slow non-streaming calls are hedged with a second request, and the 70B model
+# falls back to the 8B one when it is unavailable or under latency pressure.
+ROADMAP_MODEL = "llama-3.3-70b-versatile"
+# Faster model for quizzes and lessons
+FAST_MODEL = "llama-3.1-8b-instant"
+FALLBACK_MODELS = {ROADMAP_MODEL: FAST_MODEL}
+
+# Point this at a local OpenAI-compatible server to test against a fake upstream
+# (same meaning as the Groq SDK's base_url: it appends /openai/v1/chat/completions)
+GROQ_API_BASE = os.getenv("GROQ_API_BASE") or None
+LLM_TIMEOUTS = {
+    ROADMAP_MODEL: float(os.getenv("LLM_TIMEOUT_LARGE", "45")),
+    FAST_MODEL: float(os.getenv("LLM_TIMEOUT_FAST", "20")),
+}
+LLM_DEFAULT_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+# Longest gap allowed between streamed chunks once the first one arrived
+LLM_STREAM_IDLE_SECONDS = float(os.getenv("LLM_STREAM_IDLE_SECONDS", "15"))
+# SDK-level retries hide slow failures from the breaker; fallback and hedging replace them
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "0"))
+# Consecutive upstream failures (timeouts, 429, 5xx, connection errors) that open a model's breaker
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+# A non-streaming call still running at the model's p95 latency gets a second, identical
+# request (first answer wins), for at most LLM_HEDGE_BUDGET of calls
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+LLM_HEDGE_MIN_SECONDS = float(os.getenv("LLM_HEDGE_MIN_SECONDS", "1"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Median latency (over the last LLM_LATENCY_WINDOW_SECONDS) above which a model's calls
+# go to its fallback first
+LLM_FALLBACK_LATENCY_SECONDS = float(os.getenv("LLM_FALLBACK_LATENCY_SECONDS", "20"))
+LLM_LATENCY_WINDOW_SECONDS = float(os.getenv("LLM_LATENCY_WINDOW_SECONDS", "120"))
+
+
+class LLMUnavailable(Exception):
+    """No model could take the call: breakers open or the time budget ran out."""
+
+
+class LLMTimeout(TimeoutError):
+    pass
+
+
+def _upstream_failure(e: Exception) -> bool:
+    """Errors that say Groq is struggling (count against the breaker, trigger fallback), not that the request was bad."""
+    if isinstance(e, (TimeoutError, groq.APIConnectionError)):
+        return True
+    return isinstance(e, groq.APIStatusError) and (e.status_code == 429 or e.status_code >= 500)
+
+
+def _percentile(values: list, q: float):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `max_failures` consecutive failures; open rejects calls for
+    `reset_seconds`, then half_open lets a single probe through to decide.
+    """
+
+    def __init__(self, max_failures: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.max_failures = max_failures
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.max_failures:
+            if self.state != "open":
+                self.opens += 1
+                print(f"LLM circuit opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """The call ended without a verdict (cancelled): let the next one probe."""
+        self._probing = False
+
+
+class ModelHealth:
+    """Breaker, recent latencies and counters for one model."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.timeout = LLM_TIMEOUTS.get(model, LLM_DEFAULT_TIMEOUT)
+        self.breaker = CircuitBreaker()
+        self._latencies = deque(maxlen=200) # (finished at, seconds)
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+
+    def recent_latencies(self) -> list:
+        cutoff = time.monotonic() - LLM_LATENCY_WINDOW_SECONDS
+        return sorted(seconds for at, seconds in self._latencies if at >= cutoff)
+
+    def succeeded(self, seconds: float):
+        self.breaker.success()
+        self._latencies.append((time.monotonic(), seconds))
+
+    def failed(self, e: Exception, seconds: float):
+        if not _upstream_failure(e):
+            # Groq answered; the request itself was bad
+            self.breaker.success()
+            return
+        self.failures += 1
+        self.breaker.failure()
+        if isinstance(e, TimeoutError):
+            self.timeouts += 1
+            self._latencies.append((time.monotonic(), seconds))
+
+    def under_pressure(self) -> bool:
+        latencies = self.recent_latencies()
+        return len(latencies) >= 3 and _percentile(latencies, 0.5) > LLM_FALLBACK_LATENCY_SECONDS
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None when this call shouldn't be hedged."""
+        if not LLM_HEDGE_ENABLED or self.breaker.state != "closed" or self.hedges >= LLM_HEDGE_BUDGET * self.calls:
+            return None
+        latencies = self.recent_latencies()
+        if len(latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return max(LLM_HEDGE_MIN_SECONDS, _percentile(latencies, 0.95))
+
+    def stats(self) -> dict:
+        latencies = self.recent_latencies()
+        p50, p95 = _percentile(latencies, 0.5), _percentile(latencies, 0.95)
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "opens": self.breaker.opens,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+            "p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000) if p95 is not None else None,
+        }
+
+
+class LLMClient:
+    def __init__(self):
+        self._health = {}
+        self._chat_models = {}
+        self._http_async_client = None
+
+    def configure_http_client(self, http_async_client=None):
+        """Makes every ChatGroq instance use the app's pooled httpx client (all calls are async)."""
+        self._http_async_client = http_async_client
+        self._chat_models.clear()
+
+    def get(self, model: str, timeout: float = None) -> "ResilientLLM":
+        """A ChatGroq stand-in for `model`; `timeout` caps the whole call, fallback included."""
+        return ResilientLLM(self, model, total_timeout=timeout)
+
+    def health(self, model: str) -> ModelHealth:
+        health = self._health.get(model)
+        if health is None:
+            health = self._health[model] = ModelHealth(model)
+        return health
+
+    def _chat(self, model: str, kwargs: dict, timeout: float):
+        # ChatGroq is stateless per call, so build one per model and reuse it
+        llm = self._chat_models.get(model)
+        if llm is None:
+            llm = ChatGroq(
+                model=model,
+                temperature=0.7,
+                api_key=os.getenv("GROQ_API_KEY"),
+                base_url=GROQ_API_BASE,
+                max_retries=LLM_MAX_RETRIES,
+                http_async_client=self._http_async_client
+            )
+            self._chat_models[model] = llm
+        return llm.bind(timeout=timeout, **kwargs)
+
+    def _route(self, model: str) -> list:
+        """Models to try, in order, for a call to `model`."""
+        fallback = FALLBACK_MODELS.get(model)
+        if fallback is None:
+            return [model]
+        if self.health(model).under_pressure():
+            return [fallback, model]
+        return [model, fallback]
+
+    def _attempts(self, model: str, total_timeout: float = None):
+        """(health, timeout) for each model to try, skipping open breakers and stopping when out of time."""
+        deadline = time.monotonic() + total_timeout if total_timeout else None
+        for name in self._route(model):
+            health = self.health(name)
+            timeout = health.timeout
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    return
+            if not health.breaker.allow():
+                health.rejected += 1
+                continue
+            if name != model:
+                self.health(model).fallbacks += 1
+            yield health, timeout
+
+    async def ainvoke(self, model: str, messages, kwargs: dict = None, total_timeout: float = None):
+        error = None
+        for health, timeout in self._attempts(model, total_timeout):
+            try:
+                return await self._call(health, messages, kwargs or {}, timeout)
+            except Exception as e:
+                if not _upstream_failure(e):
+                    raise
+                print(f"LLM call to {health.model} failed: {e!r}")
+                error = e
+        raise error or LLMUnavailable(f"No model available for {model} (circuit open)")
+
+    async def _call(self, health: ModelHealth, messages, kwargs: dict, timeout: float):
+        """One call to one model: timeout, hedging, latency and the breaker verdict."""
+        llm = self._chat(health.model, kwargs, timeout)
+        health.calls += 1
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(llm.ainvoke(messages))]
+        try:
+            delay = health.hedge_delay()
+            if delay is not None and delay < timeout:
+                await asyncio.wait(tasks, timeout=delay)
+                if not tasks[0].done():
+                    health.hedges += 1
+                    tasks.append(asyncio.ensure_future(llm.ainvoke(messages)))
+            pending, error = set(tasks), None
+            while pending:
+                remaining = started + timeout - time.monotonic()
+                done, pending = await asyncio.wait(pending, timeout=max(0, remaining), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise LLMTimeout(f"{health.model} timed out after {timeout:.0f}s")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            health.hedge_wins += 1
+                        health.succeeded(time.monotonic() - started)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        except asyncio.CancelledError:
+            health.breaker.release()
+            raise
+        except Exception as e:
+            health.failed(e, time.monotonic() - started)
+            raise
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def astream(self, model: str, messages, kwargs: dict = None, total_timeout: float = None):
+        """
+        Streamed chunks from the first model that starts answering. Not hedged, and only
+        falls back before the first chunk: after that the tokens are already with the client.
+        """
+        error = None
+        for health, timeout in self._attempts(model, total_timeout):
+            health.calls += 1
+            started = time.monotonic()
+            stream = self._chat(health.model, kwargs or {}, timeout).astream(messages).__aiter__()
+            streaming = False
+            try:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout)
+                except StopAsyncIteration:
+                    health.succeeded(time.monotonic() - started)
+                    return
+                except asyncio.TimeoutError:
+                    raise LLMTimeout(f"{health.model} sent nothing for {timeout:.0f}s")
+                # Answering again: close the breaker (or end the probe) now, not when the stream ends
+                health.breaker.success()
+                streaming = True
+                while True:
+                    yield chunk
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), LLM_STREAM_IDLE_SECONDS)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise LLMTimeout(f"{health.model} stream stalled for {LLM_STREAM_IDLE_SECONDS:.0f}s")
+                health.succeeded(time.monotonic() - started)
+                return
+            except (asyncio.CancelledError, GeneratorExit):
+                health.breaker.release()
+                raise
+            except Exception as e:
+                health.failed(e, time.monotonic() - started)
+                if streaming or not _upstream_failure(e):
+                    raise
+                print(f"LLM stream from {health.model} failed: {e!r}")
+                error = e
+            finally:
+                await stream.aclose()
+        raise error or LLMUnavailable(f"No model available for {model} (circuit open)")
+
+    def stats(self) -> dict:
+        return {model: health.stats() for model, health in self._health.items()}
+
+
+class ResilientLLM:
+    """Drop-in for a ChatGroq model (ainvoke / astream / bind) that goes through LLMClient."""
+
+    def __init__(self, client: LLMClient, model: str, kwargs: dict = None, total_timeout: float = None):
+        self._client = client
+        self.model = model
+        self.kwargs = kwargs or {}
+        self.total_timeout = total_timeout
+
+    def bind(self, **kwargs) -> "ResilientLLM":
+        return ResilientLLM(self._client, self.model, {**self.kwargs, **kwargs}, self.total_timeout)
+
+    async def ainvoke(self, messages):
+        return await self._client.ainvoke(self.model, messages, self.kwargs, self.total_timeout)
+
+    def astream(self, messages):
+        return self._client.astream(self.model, messages, self.kwargs, self.total_timeout)
+
+
+llm_client = LLMClient()
@@ -0,0 +1,47 @@
+from langchain_core.prompts import ChatPromptTemplate
+from core.text import estimate_tokens
+
+# Every LLM prompt is compiled once at import and registered here with a pinned version.
+# `Prompt.id` ("<name>:v<version>:<model>") goes into response cache keys, so bumping a
+# version (or switching the model) stops old cached answers from being reused.
+
+class Prompt:
+    def __init__(self, name: str, version: int, model: str, template: str, system: str = None, partials: dict = None):
+        self.name = name
+        self.version = version
+        self.model = model
+        messages = ([("system", system)] if system else []) + [("human", template)]
+        self.template = ChatPromptTemplate.from_messages(messages)
+        if partials:
+            self.template = self.template.partial(**partials)
+        # Fixed part of the prompt (instructions + format instructions), without any variables
+        blanks = {name: "" for name in self.template.input_variables}
+        self.base_tokens = self.count_tokens(self.template.format_messages(**blanks))
+
+    @property
+    def id(self) -> str:
+        return f"{self.name}:v{self.version}:{self.model}"
+
+    def messages(self, **variables):
+        """LangChain messages, for ChatGroq."""
+        return self.template.format_messages(**variables)
+
+    @staticmethod
+    def count_tokens(messages) -> int:
+        return sum(estimate_tokens(m.content) for m in messages)
+
+
+_registry = {}
+
+
+def register(name: str, version: int, model: str, template: str, system: str = None, partials: dict = None) -> Prompt:
+    if name in _registry:
+        raise ValueError(f"Prompt '{name}' is already registered")
+    prompt = Prompt(name, version, model, template, system=system, partials=partials)
+    _registry[name] = prompt
+    return prompt
+
+
+def prompt_stats() -> dict:
+    """Per prompt: version, model and the token cost of its fixed part."""
+    return {p.name: {"id": p.id, "base_tokens": p.base_tokens} for p in _registry.values()}
@@ -0,0 +1,219 @@
+import asyncio
+import os
+import random
+import time
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from models import QuizSet
+from core.singleflight import SingleFlight
+from core.text import normalize_topic
+from services import ai_service
+
+# Quizzes come from a bank instead of one LLM call per request. Each (normalized topic,
+# difficulty) keeps up to QUIZ_POOL_TARGET generated quizzes, and every request samples
+# QUIZ_QUESTIONS questions across them. New roadmaps get their quizzes warmed in the
+# background, so the first "Take Quiz" is usually a DB read too.
+QUIZ_POOL_TARGET = int(os.getenv("QUIZ_POOL_TARGET", "3"))
+QUIZ_QUESTIONS = int(os.getenv("QUIZ_QUESTIONS", "5"))
+QUIZ_WARM_WORKERS = int(os.getenv("QUIZ_WARM_WORKERS", "2"))
+QUIZ_WARM_MAX_QUEUE = int(os.getenv("QUIZ_WARM_MAX_QUEUE", "500"))
+QUIZ_WARM_DIFFICULTY = os.getenv("QUIZ_WARM_DIFFICULTY", "Beginner")
+QUIZ_WARM_RPM = float(os.getenv("QUIZ_WARM_RPM", "10")) # LLM calls per minute, all workers
+# Pause after a failed generation (usually Groq rate limiting) before starting another
+QUIZ_WARM_BACKOFF_SECONDS = float(os.getenv("QUIZ_WARM_BACKOFF_SECONDS", "30"))
+# Module titles (what the quiz button sends) are always warmed; this adds every topic
+QUIZ_WARM_TOPICS = os.getenv("QUIZ_WARM_TOPICS", "false").lower() == "true"
+
+DIFFICULTIES = ("Beginner", "Intermediate", "Advanced")
+
+_generation_flight = SingleFlight()
+
+
+def normalize_difficulty(difficulty: str):
+    """Canonical difficulty name, or None if it isn't one we serve."""
+    value = (difficulty or "").strip().title()
+    return value if value in DIFFICULTIES else None
+
+
+def _usable_questions(questions) -> list:
+    """Drops questions the quiz modal can't grade (fewer than 2 options or not exactly one correct)."""
+    usable = []
+    for question in questions or []:
+        options = question.get("options") or []
+        if question.get("question") and len(options) >= 2 and sum(1 for o in options if o.get("is_correct")) == 1:
+            usable.append(question)
+    return usable
+
+
+def sample_quiz(topic: str, question_sets, count: int = QUIZ_QUESTIONS) -> dict:
+    """A quiz of `count` distinct questions drawn from all pooled sets, options shuffled."""
+    unique = {}
+    for questions in question_sets:
+        for question in questions:
+            unique.setdefault(normalize_topic(question["question"]), question)
+    chosen = random.sample(list(unique.values()), min(count, len(unique)))
+    quiz = []
+    for question in chosen:
+        options = list(question["options"])
+        random.shuffle(options)
+        quiz.append({**question, "options": options})
+    return {"topic": topic, "questions": quiz}
+
+
+def _pool_filter(topic_key: str, difficulty: str):
+    return (
+        QuizSet.topic_key == topic_key,
+        QuizSet.difficulty == difficulty,
+        QuizSet.prompt_version == ai_service.QUIZ_PROMPT.id,
+    )
+
+
+async def pool_size(db: AsyncSession, topic_key: str, difficulty: str) -> int:
+    return (await db.execute(select(func.count(QuizSet.id)).where(*_pool_filter(topic_key, difficulty)))).scalar()
+
+
+async def _generate_set(topic: str, topic_key: str, difficulty: str) -> dict:
+    """One LLM quiz, stored in the bank unless the pool filled up meanwhile. Errors are returned, not stored."""
+    result = await ai_service.agenerate_quiz(topic, difficulty)
+    if "error" in result:
+        return result
+    questions = _usable_questions(result.get("questions"))
+    if not questions:
+        return {"error": "Failed to generate quiz", "details": "No usable questions in the response"}
+    # Own session: the flight outlives whichever request (or warmer) started it
+    async with AsyncSessionLocal() as db:
+        if await pool_size(db, topic_key, difficulty) < QUIZ_POOL_TARGET:
+            db.add(QuizSet(
+                topic_key=topic_key,
+                topic=topic,
+                difficulty=difficulty,
+                prompt_version=ai_service.QUIZ_PROMPT.id,
+                questions=questions
+            ))
+            await db.commit()
+    return {"questions": questions}
+
+
+async def get_quiz(db: AsyncSession, topic: str, difficulty: str = "Beginner") -> dict:
+    """
+    Quiz for (topic, difficulty) sampled from the bank. Only an empty pool waits for
+    the LLM (one call per key at a time); a pool below target is topped up in the background.
+    """
+    topic_key = normalize_topic(topic)
+    if not topic_key:
+        # Nothing to pool it under: one-off quiz, not stored
+        result = await ai_service.agenerate_quiz(topic, difficulty)
+        if "error" in result:
+            return result
+        return sample_quiz(topic, [_usable_questions(result.get("questions"))])
+
+    question_sets = (await db.execute(
+        select(QuizSet.questions).where(*_pool_filter(topic_key, difficulty))
+    )).scalars().all()
+
+    if not question_sets:
+        result = await _generation_flight.do(
+            (topic_key, difficulty), lambda: _generate_set(topic, topic_key, difficulty)
+        )
+        if "error" in result:
+            return result
+        question_sets = [result["questions"]]
+
+    if len(question_sets) < QUIZ_POOL_TARGET:
+        quiz_warmer.enqueue(topic, difficulty, min_sets=QUIZ_POOL_TARGET)
+    return sample_quiz(topic, question_sets)
+
+
+class QuizWarmer:
+    """Background workers that fill the bank ahead of requests (new roadmaps, pool top-ups)."""
+
+    def __init__(self, workers: int = QUIZ_WARM_WORKERS, rpm: float = QUIZ_WARM_RPM):
+        self.workers = workers
+        self.min_interval = 60.0 / rpm if rpm > 0 else 0.0
+        self._queue = asyncio.Queue(maxsize=QUIZ_WARM_MAX_QUEUE)
+        self._pending = set()
+        self._tasks = []
+        self._next_start = 0.0
+        self.generated = 0
+        self.failed = 0
+
+    def enqueue(self, topic: str, difficulty: str = QUIZ_WARM_DIFFICULTY, min_sets: int = 1):
+        """Fills (topic, difficulty) up to `min_sets` quizzes. Duplicates and overflow are dropped."""
+        key = (normalize_topic(topic), difficulty)
+        if not key[0] or key in self._pending:
+            return
+        try:
+            self._queue.put_nowait((topic, difficulty, min_sets))
+        except asyncio.QueueFull:
+            return
+        self._pending.add(key)
+
+    def enqueue_roadmap(self, content: dict, difficulty: str = QUIZ_WARM_DIFFICULTY):
+        """Warms one quiz per module title, then (optionally) per topic, in roadmap order."""
+        modules = (content or {}).get("roadmap") or []
+        for module in modules:
+            self.enqueue(str(module.get("title", "")), difficulty)
+        if QUIZ_WARM_TOPICS:
+            for module in modules:
+                for topic in module.get("topics", []):
+                    self.enqueue(str(topic), difficulty)
+
+    async def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            topic, difficulty, min_sets = await self._queue.get()
+            try:
+                await self._warm(topic, difficulty, min_sets)
+            except Exception as e:
+                self._failed(topic, e)
+            finally:
+                self._pending.discard((normalize_topic(topic), difficulty))
+                self._queue.task_done()
+
+    async def _throttle(self):
+        """Spaces LLM call starts min_interval apart across all workers."""
+        now = time.monotonic()
+        start = max(now, self._next_start)
+        self._next_start = start + self.min_interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def _failed(self, topic: str, error):
+        self.failed += 1
+        self._next_start = max(self._next_start, time.monotonic() + QUIZ_WARM_BACKOFF_SECONDS)
+        print(f"Quiz warm-up failed for {topic!r}: {error}")
+
+    async def _warm(self, topic: str, difficulty: str, min_sets: int):
+        topic_key = normalize_topic(topic)
+        async with AsyncSessionLocal() as db:
+            missing = min(min_sets, QUIZ_POOL_TARGET) - await pool_size(db, topic_key, difficulty)
+        for _ in range(missing):
+            await self._throttle()
+            result = await _generation_flight.do(
+                (topic_key, difficulty), lambda: _generate_set(topic, topic_key, difficulty)
+            )
+            if "error" in result:
+                self._failed(topic, result.get("details") or result["error"])
+                return
+            self.generated += 1
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "workers": len(self._tasks),
+            "generated": self.generated,
+            "failed": self.failed,
+        }
+
+
+quiz_warmer = QuizWarmer()
@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import signal
+import tempfile
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Resume PDFs are parsed in a small process pool so a slow or hostile file can only
+# tie up a pool worker, never the event loop. Each file gets a wall-clock budget and
+# extraction stops as soon as RESUME_MAX_CHARS of text has been collected.
+RESUME_MAX_BYTES = int(os.getenv("RESUME_MAX_BYTES", str(5 * 1024 * 1024)))
+RESUME_MAX_CHARS = int(os.getenv("RESUME_MAX_CHARS", "50000"))
+RESUME_MAX_PAGES = int(os.getenv("RESUME_MAX_PAGES", "30"))
+RESUME_PARSE_SECONDS = float(os.getenv("RESUME_PARSE_SECONDS", "10"))
+RESUME_PARSE_WORKERS = int(os.getenv("RESUME_PARSE_WORKERS", "2"))
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+class ResumeTooLarge(Exception):
+    pass
+
+
+class ResumeParseError(Exception):
+    pass
+
+
+class ResumeParseTimeout(ResumeParseError):
+    pass
+
+
+class _BudgetExceeded(BaseException):
+    # BaseException so pypdf's lenient `except Exception` recovery paths can't swallow it
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _BudgetExceeded()
+
+
+def _extract_text(path: str, max_chars: int, max_pages: int, seconds: float) -> str:
+    """Runs in a pool worker. pypdf reads the file lazily, page by page."""
+    import pypdf
+
+    # Worker-side budget: interrupts pure-Python parsing loops; the parent's
+    # wait_for is the backstop for anything stuck in C
+    signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        reader = pypdf.PdfReader(path)
+        parts, total = [], 0
+        for index, page in enumerate(reader.pages):
+            if index >= max_pages or total >= max_chars:
+                break
+            text = (page.extract_text() or "") + "\n"
+            parts.append(text)
+            total += len(text)
+        return "".join(parts)[:max_chars]
+    except _BudgetExceeded:
+        raise ResumeParseTimeout("PDF took too long to process")
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class ResumeParser:
+    def __init__(self, workers: int = RESUME_PARSE_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._semaphore = asyncio.Semaphore(workers)
+        # Pools killed by _reset: parses that were running in one of them didn't fail on their own
+        self._killed = weakref.WeakSet()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: don't fork the server process (event loop, DB pools, threads) per worker
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _reset(self, executor: ProcessPoolExecutor):
+        """
+        Kills a pool after one of its workers blew its budget (a worker stuck in C can't be
+        stopped any other way); the next parse starts a fresh one.
+        """
+        if self._executor is executor:
+            self._executor = None
+        if executor in self._killed:
+            return
+        self._killed.add(executor)
+        for process in list((executor._processes or {}).values()):
+            process.kill()
+        # Queued and running calls all fail with BrokenProcessPool (parse() retries them)
+        executor.shutdown(wait=False)
+
+    async def parse(self, path: str) -> str:
+        # One file per worker at a time, so the budget isn't spent waiting in the pool's queue
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            for attempt in range(2):
+                executor = self._pool()
+                future = loop.run_in_executor(
+                    executor, _extract_text, path, RESUME_MAX_CHARS, RESUME_MAX_PAGES, RESUME_PARSE_SECONDS
+                )
+                try:
+                    return await asyncio.wait_for(future, RESUME_PARSE_SECONDS + 2)
+                except ResumeParseError:
+                    raise
+                except TimeoutError:
+                    self._reset(executor)
+                    raise ResumeParseTimeout("PDF took too long to process")
+                except BrokenProcessPool:
+                    if executor in self._killed and attempt == 0:
+                        # Killed because another file hung, not because of this one: run it again
+                        continue
+                    self._reset(executor)
+                    raise ResumeParseError("Failed to read PDF file")
+                except Exception as e:
+                    raise ResumeParseError("Failed to read PDF file") from e
+
+    async def spool_upload(self, upload):
+        """
+        Copies an UploadFile to a temp file in chunks, enforcing RESUME_MAX_BYTES.
+        Returns (path, sha256 hex digest); the caller deletes the file.
+        """
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        digest = hashlib.sha256()
+        try:
+            size = 0
+            with os.fdopen(fd, "wb") as out:
+                while chunk := await upload.read(COPY_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > RESUME_MAX_BYTES:
+                        raise ResumeTooLarge()
+                    digest.update(chunk)
+                    out.write(chunk)
+        except BaseException:
+            os.unlink(path)
+            raise
+        return path, digest.hexdigest()
+
+    async def parse_upload(self, upload) -> str:
+        path, _ = await self.spool_upload(upload)
+        try:
+            return await self.parse(path)
+        finally:
+            os.unlink(path)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+resume_parser = ResumeParser()
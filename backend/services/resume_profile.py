@@ -0,0 +1,193 @@
+import datetime
+import os
+import re
+from fastapi.concurrency import run_in_threadpool
+from core.cache import TTLCache
+from core.text import estimate_tokens, normalize_topic
+from services.github_service import NPM_SKILLS, PYTHON_SKILLS, GO_SKILLS
+from services.resume_parser import resume_parser
+from services.skill_matcher import SkillMatcher
+
+# The roadmap prompt only needs who the user is (skills, roles, experience) plus a few
+# supporting lines, not 50k characters of raw PDF text. Resumes are compressed to
+# RESUME_TOKEN_BUDGET tokens before prompt construction, and the result is cached by
+# upload hash so re-uploading the same file skips parsing and compression.
+RESUME_TOKEN_BUDGET = int(os.getenv("RESUME_TOKEN_BUDGET", "600"))
+RESUME_PROFILE_CACHE_SIZE = int(os.getenv("RESUME_PROFILE_CACHE_SIZE", "256"))
+RESUME_PROFILE_CACHE_TTL = float(os.getenv("RESUME_PROFILE_CACHE_TTL", "86400"))
+# Bump when the output format changes so cached profiles are rebuilt
+RESUME_PROFILE_VERSION = "3"
+
+_profile_cache = TTLCache(maxsize=RESUME_PROFILE_CACHE_SIZE, ttl=RESUME_PROFILE_CACHE_TTL)
+
+# "Go", "C" and "R" are left out: as plain words they match far too much prose
+RESUME_SKILLS = sorted(
+    set(NPM_SKILLS.values()) | set(PYTHON_SKILLS.values()) | set(GO_SKILLS.values()) | {
+        "Python", "JavaScript", "TypeScript", "Java", "Kotlin", "Swift", "C++", "C#", "Rust", "Ruby",
+        "PHP", "Scala", "Dart", "Flutter", "HTML", "CSS", "SQL", "PostgreSQL", "MySQL", "SQLite",
+        "Redis", "Elasticsearch", "Kafka", "RabbitMQ", "Docker", "Kubernetes", "Terraform", "AWS",
+        "Azure", "GCP", "Linux", "Git", "CI/CD", "Node.js", "Spring", "Spring Boot", ".NET", "Rails",
+        "Laravel", "Machine Learning", "Deep Learning", "NLP", "Computer Vision", "Data Analysis",
+        "Spark", "Hadoop", "Airflow", "Tableau", "Power BI", "Excel", "Figma", "REST", "Microservices",
+        "Android", "iOS", "Unity", "Solidity", "Selenium", "Cypress", "Jenkins", "Ansible",
+    }
+)
+_DISPLAY = {}
+for _skill in RESUME_SKILLS:
+    _DISPLAY.setdefault(normalize_topic(_skill), _skill)
+_matcher = SkillMatcher(RESUME_SKILLS)
+
+_ROLE = re.compile(
+    r"\b(?:(?:senior|junior|lead|staff|principal|associate|sr\.?|jr\.?)\s+)?"
+    r"(?:(?:software|frontend|front[- ]end|backend|back[- ]end|full[- ]?stack|web|mobile|android|ios|"
+    r"data|machine learning|ml|ai|devops|cloud|site reliability|qa|test|security|embedded|game|"
+    r"product|project|ui/ux|ux|ui)\s+)+"
+    r"(?:engineer|developer|scientist|analyst|architect|designer|manager|intern|consultant|administrator)s?\b",
+    re.IGNORECASE,
+)
+_YEARS_STATED = re.compile(r"\b(\d{1,2})\+?\s*(?:years?|yrs?)\b", re.IGNORECASE)
+_DATE_RANGE = re.compile(
+    r"\b((?:19|20)\d{2})\s*(?:-|–|—|to)\s*((?:19|20)\d{2}|present|current|now|today)\b", re.IGNORECASE
+)
+# Contact details and PDF furniture: no use to the curriculum prompt
+_BOILERPLATE = re.compile(
+    r"(\S+@\S+\.\w+|https?://|www\.|linkedin|github\.com|^page \d+( of \d+)?$|"
+    r"references (are )?available|curriculum vitae|^resume$|^cv$)",
+    re.IGNORECASE,
+)
+# Phone-number candidates; only counted as one with 9+ digits (so "2018 - 2023" isn't)
+_PHONE = re.compile(r"\+?\(?\d[\d\s().-]{7,}\d")
+_DIGITS = re.compile(r"\d+")
+
+
+def _is_phone(line: str) -> bool:
+    # Date ranges are taken out first: "2018 - 2023" has the shape of a short number
+    line = _DATE_RANGE.sub(" ", line)
+    return any(sum(ch.isdigit() for ch in m.group()) >= 9 for m in _PHONE.finditer(line))
+
+
+def _clean_lines(text: str):
+    """Non-empty lines with whitespace collapsed, boilerplate dropped and duplicates removed."""
+    seen = set()
+    for raw in text.splitlines():
+        line = " ".join(raw.split())
+        if len(line) < 3 or _BOILERPLATE.search(line) or _is_phone(line):
+            continue
+        # Lines that only differ in numbers ("Page 1" / "Page 2", templated bullets) count once
+        key = _DIGITS.sub("#", normalize_topic(line))
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        yield line
+
+
+def _years_of_experience(text: str):
+    """(years, first_year) from stated "N years" or the span of date ranges, else (None, None)."""
+    this_year = datetime.date.today().year
+    starts, ends = [], []
+    for start, end in _DATE_RANGE.findall(text):
+        start = int(start)
+        end = this_year if not end.isdigit() else int(end)
+        if start <= end <= this_year:
+            starts.append(start)
+            ends.append(end)
+    stated = max((int(n) for n in _YEARS_STATED.findall(text) if int(n) <= 50), default=None)
+    spanned = max(ends) - min(starts) if starts else None
+    candidates = [y for y in (stated, spanned) if y is not None]
+    years = max(candidates) if candidates else None
+    return years, (min(starts) if starts else None)
+
+
+def summarize_resume(text: str, budget: int = RESUME_TOKEN_BUDGET) -> str:
+    """
+    Compresses raw resume text into a short profile that fits in `budget` tokens:
+    detected skills, roles and years of experience, then the most informative lines
+    (ones naming a skill, a role or a number) in their original order.
+    """
+    if not text or not text.strip():
+        return ""
+    lines = list(_clean_lines(text))
+
+    skills, roles = {}, {}
+    scored = []
+    for index, line in enumerate(lines):
+        found = _matcher.match(line)
+        for skill in found:
+            skills[skill] = skills.get(skill, 0) + 1
+        line_roles = [" ".join(m.split()).title() for m in _ROLE.findall(line)]
+        for role in line_roles:
+            roles.setdefault(role.lower(), role)
+        score = 2 * len(found) + 5 * len(line_roles) + (1 if _DIGITS.search(line) else 0)
+        if score:
+            scored.append((score, index))
+
+    header = []
+    if roles:
+        header.append("Roles: " + ", ".join(list(roles.values())[:6]))
+    if skills:
+        ranked = sorted(skills, key=lambda s: (-skills[s], s))
+        header.append("Skills: " + ", ".join(_DISPLAY.get(s, s) for s in ranked[:30]))
+    years, since = _years_of_experience(text)
+    if years is not None:
+        header.append(f"Experience: ~{years} years" + (f" (since {since})" if since else ""))
+
+    profile = "\n".join(header)
+    remaining = budget - estimate_tokens(profile) - 2
+    # Best lines first when choosing, original order when printing
+    chosen = []
+    for score, index in sorted(scored, key=lambda item: (-item[0], item[1])):
+        cost = estimate_tokens(lines[index]) + 1
+        if cost <= remaining:
+            chosen.append(index)
+            remaining -= cost
+    if chosen:
+        highlights = "\n".join("- " + lines[i] for i in sorted(chosen))
+        profile = f"{profile}\nHighlights:\n{highlights}" if profile else f"Highlights:\n{highlights}"
+    return fit_to_budget(profile, budget)
+
+
+def fit_to_budget(text: str, budget: int = RESUME_TOKEN_BUDGET) -> str:
+    """Hard cap: trims whole lines (then characters) until `text` fits in `budget` tokens."""
+    if estimate_tokens(text) <= budget:
+        return text
+    lines = text.splitlines()
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > budget:
+        lines.pop()
+    text = "\n".join(lines)
+    while text and estimate_tokens(text) > budget:
+        text = text[: max(0, min(len(text) - 1, budget * 4))].rstrip()
+    return text
+
+
+def profile_cache_key(file_hash: str, budget: int = RESUME_TOKEN_BUDGET) -> str:
+    return f"{file_hash}:{budget}:{RESUME_PROFILE_VERSION}"
+
+
+def cached_profile(file_hash: str):
+    return _profile_cache.get(profile_cache_key(file_hash))
+
+
+def cache_profile(file_hash: str, profile: str):
+    _profile_cache.set(profile_cache_key(file_hash), profile)
+
+
+def cache_stats() -> dict:
+    return _profile_cache.stats()
+
+
+async def profile_from_upload(upload) -> str:
+    """
+    Compressed profile for an uploaded resume PDF. Raises the resume_parser errors.
+    Uploads already seen (same bytes) come straight from the cache.
+    """
+    path, file_hash = await resume_parser.spool_upload(upload)
+    try:
+        profile = cached_profile(file_hash)
+        if profile is None:
+            text = await resume_parser.parse(path)
+            profile = await run_in_threadpool(summarize_resume, text)
+            cache_profile(file_hash, profile)
+            print(f"Resume profile: ~{estimate_tokens(text)} -> ~{estimate_tokens(profile)} tokens")
+        return profile
+    finally:
+        os.unlink(path)
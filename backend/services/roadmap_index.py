@@ -0,0 +1,198 @@
+import asyncio
+import math
+import os
+import time
+import zlib
+from array import array
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Roadmap
+from core.text import normalize_topic
+from services.skill_matcher import canonical_skill
+
+# Nearest-neighbour lookup over the inputs of past roadmaps, so a request for a goal we
+# have already generated ("Become a React developer" ~ "learn react") can reuse that
+# roadmap instead of another 70B generation. Goals are compared as hashed TF-IDF vectors
+# (unigrams + bigrams) through an inverted index; current skills must also overlap.
+# Only roadmaps generated without a resume are reused: those can mention the owner's background.
+ROADMAP_REUSE_ENABLED = os.getenv("ROADMAP_REUSE_ENABLED", "true").lower() == "true"
+ROADMAP_REUSE_THRESHOLD = float(os.getenv("ROADMAP_REUSE_THRESHOLD", "0.8"))
+ROADMAP_REUSE_SKILLS_THRESHOLD = float(os.getenv("ROADMAP_REUSE_SKILLS_THRESHOLD", "0.6"))
+ROADMAP_INDEX_MAX = int(os.getenv("ROADMAP_INDEX_MAX", "20000"))
+# How often to pick up roadmaps saved by other workers
+ROADMAP_INDEX_REFRESH_SECONDS = float(os.getenv("ROADMAP_INDEX_REFRESH_SECONDS", "60"))
+
+_FEATURE_BITS = 20
+_FEATURE_MASK = (1 << _FEATURE_BITS) - 1
+
+# Words that say nothing about *what* to learn (role nouns included: "React developer" ~ "React")
+_STOPWORDS = {
+    "a", "an", "the", "i", "im", "me", "my", "to", "be", "become", "becoming", "learn",
+    "developer", "developers", "dev", "engineer", "engineers", "programmer", "programming",
+    "want", "wanna", "would", "like", "how", "get", "good", "better", "at", "in", "on", "of", "for",
+    "and", "or", "with", "as", "from", "into", "master", "mastering", "roadmap", "path", "guide",
+    "career", "start", "started", "starting", "beginner", "basics", "skills", "level", "up",
+}
+
+
+def _terms(text: str) -> list:
+    """(term, weight) pairs: words at full weight, adjacent pairs at half (word order matters less)."""
+    words = []
+    for word in normalize_topic(text).split():
+        if word in _STOPWORDS:
+            continue
+        word = canonical_skill(word)
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1] # crude plural folding: "apis" -> "api", "developers" -> "developer"
+        words.append(word)
+    return [(w, 1.0) for w in words] + [(f"{a} {b}", 0.5) for a, b in zip(words, words[1:])]
+
+
+def _features(text: str) -> dict:
+    """feature id -> sublinear term frequency (times the term weight)."""
+    counts, weights = {}, {}
+    for term, weight in _terms(text):
+        feature = zlib.crc32(term.encode()) & _FEATURE_MASK
+        counts[feature] = counts.get(feature, 0) + 1
+        weights[feature] = weight
+    return {f: (1.0 + math.log(c)) * weights[f] for f, c in counts.items()}
+
+
+def _skill_set(skills: str) -> frozenset:
+    """"Python, react.js; SQL" -> {"python", "react", "sql"}."""
+    parts = (skills or "").replace(";", ",").replace("\n", ",").split(",")
+    return frozenset(canonical_skill(normalize_topic(p)) for p in parts if normalize_topic(p))
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class RoadmapIndex:
+    def __init__(self, max_size: int = ROADMAP_INDEX_MAX, refresh_seconds: float = ROADMAP_INDEX_REFRESH_SECONDS):
+        self.max_size = max_size
+        self.refresh_seconds = refresh_seconds
+        self._lock = asyncio.Lock()
+        self._reset()
+        self.lookups = 0
+        self.reuses = 0
+
+    def _reset(self):
+        self._roadmap_ids = array("l") # slot -> newest roadmap id for these inputs
+        self._features = [] # slot -> array("l") feature ids
+        self._weights = [] # slot -> array("d") term frequencies, parallel to _features
+        self._skills = [] # slot -> frozenset of canonical skills
+        self._postings = {} # feature id -> array("l") of slots
+        self._exact = {} # (normalized goal, skills) -> slot
+        # Highest id loaded from the DB. Only _refresh moves it: ids saved by this worker can be
+        # higher than roadmaps other workers committed in the meantime, which must still be loaded.
+        self._db_high_water = 0
+        self._local_ids = set() # ids add()ed by this worker above the high-water mark
+        self._loaded_at = None
+        self._full = False
+
+    def __len__(self):
+        return len(self._roadmap_ids)
+
+    def add(self, roadmap_id: int, goal: str, current_skills: str = ""):
+        """Indexes a roadmap this worker just saved."""
+        if roadmap_id > self._db_high_water:
+            self._local_ids.add(roadmap_id)
+        self._insert(roadmap_id, goal, current_skills)
+
+    def _insert(self, roadmap_id: int, goal: str, current_skills: str):
+        skills = _skill_set(current_skills)
+        key = (normalize_topic(goal), skills)
+        slot = self._exact.get(key)
+        if slot is not None:
+            # Same inputs again: point at the newer roadmap, the vectors are unchanged
+            self._roadmap_ids[slot] = max(self._roadmap_ids[slot], roadmap_id)
+            return
+        features = _features(goal)
+        if not features:
+            return
+        if len(self._roadmap_ids) >= self.max_size:
+            # Full: rebuilt from the most recent roadmaps on the next refresh
+            self._full = True
+            return
+        slot = len(self._roadmap_ids)
+        self._roadmap_ids.append(roadmap_id)
+        self._features.append(array("l", features.keys()))
+        self._weights.append(array("d", features.values()))
+        self._skills.append(skills)
+        self._exact[key] = slot
+        for feature in features:
+            self._postings.setdefault(feature, array("l")).append(slot)
+
+    async def _refresh(self, db: AsyncSession):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return
+        async with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+                return
+            if self._full:
+                self._reset()
+            query = select(Roadmap.id, Roadmap.goal, Roadmap.current_skills).where(
+                Roadmap.id > self._db_high_water,
+                Roadmap.has_resume.is_(False),
+                Roadmap.source_roadmap_id.is_(None),
+                Roadmap.goal.is_not(None),
+            ).order_by(Roadmap.id.desc()).limit(self.max_size)
+            rows = (await db.execute(query)).all()
+            for roadmap_id, goal, skills in reversed(rows):
+                if roadmap_id not in self._local_ids:
+                    self._insert(roadmap_id, goal, skills or "")
+            if rows:
+                self._db_high_water = max(self._db_high_water, rows[0][0])
+                self._local_ids = {i for i in self._local_ids if i > self._db_high_water}
+            self._loaded_at = time.monotonic()
+
+    def nearest(self, goal: str, current_skills: str = ""):
+        """(roadmap_id, goal similarity) of the best match whose skills overlap enough, or None."""
+        query = _features(goal)
+        if not query or not self._roadmap_ids:
+            return None
+        total = len(self._roadmap_ids)
+        idf = lambda f: math.log((total + 1) / (len(self._postings.get(f, ())) + 1)) + 1.0
+
+        query_weights = {f: tf * idf(f) for f, tf in query.items()}
+        query_norm = math.sqrt(sum(w * w for w in query_weights.values()))
+        candidates = set()
+        for feature in query_weights:
+            candidates.update(self._postings.get(feature, ()))
+
+        skills = _skill_set(current_skills)
+        best = None
+        for slot in candidates:
+            if _jaccard(skills, self._skills[slot]) < ROADMAP_REUSE_SKILLS_THRESHOLD:
+                continue
+            dot, norm = 0.0, 0.0
+            for feature, tf in zip(self._features[slot], self._weights[slot]):
+                weight = tf * idf(feature)
+                norm += weight * weight
+                dot += weight * query_weights.get(feature, 0.0)
+            score = dot / (query_norm * math.sqrt(norm))
+            if best is None or score > best[1] or (score == best[1] and self._roadmap_ids[slot] > best[0]):
+                best = (self._roadmap_ids[slot], score)
+        return best
+
+    async def find_similar(self, db: AsyncSession, goal: str, current_skills: str = ""):
+        """A stored Roadmap close enough to (goal, skills) to reuse, or None."""
+        await self._refresh(db)
+        self.lookups += 1
+        match = self.nearest(goal, current_skills)
+        if match is None or match[1] < ROADMAP_REUSE_THRESHOLD:
+            return None
+        roadmap = await db.get(Roadmap, match[0])
+        if roadmap is None or not (roadmap.content or {}).get("roadmap"):
+            return None
+        self.reuses += 1
+        return roadmap
+
+    def stats(self) -> dict:
+        return {"size": len(self), "lookups": self.lookups, "reuses": self.reuses}
+
+
+roadmap_index = RoadmapIndex()
@@ -0,0 +1,113 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Roadmap, RoadmapTopic
+from core.text import normalize_topic
+from services.ai_service import agenerate_roadmap
+from services.job_queue import JobFailed
+from services.quiz_bank import quiz_warmer
+from services.lesson_prefetch import lesson_prefetcher
+from services.roadmap_index import roadmap_index, ROADMAP_REUSE_ENABLED
+
+
+def count_topics(content: dict) -> int:
+    """Number of topics across all modules of a roadmap's JSON content."""
+    if not content or "roadmap" not in content:
+        return 0
+    return sum(len(module.get("topics", [])) for module in content["roadmap"])
+
+
+def topic_rows(roadmap_id: int, content: dict) -> list:
+    """`roadmap_topics` rows for a roadmap's JSON content."""
+    if not content or "roadmap" not in content:
+        return []
+    return [
+        {
+            "roadmap_id": roadmap_id,
+            "module_index": m_index,
+            "topic_index": t_index,
+            "title": str(topic),
+            "normalized_title": normalize_topic(str(topic)),
+        }
+        for m_index, module in enumerate(content["roadmap"])
+        for t_index, topic in enumerate(module.get("topics", []))
+    ]
+
+
+async def save_roadmap(
+    db: AsyncSession, user_id: int, goal: str, content: dict,
+    current_skills: str = "", has_resume: bool = False, source_roadmap_id: int = None
+) -> Roadmap:
+    """
+    Stores a generated (or reused, see `source_roadmap_id`) roadmap and its topic rows for the
+    user and returns the refreshed row. Also queues lesson prefetch and quiz warm-up for its topics.
+    """
+    db_roadmap = Roadmap(
+        title=f"Roadmap to {goal}",
+        description=f"Generated roadmap for {goal}",
+        user_id=user_id,
+        content=content,
+        total_topics=count_topics(content),
+        goal=goal,
+        current_skills=current_skills or "",
+        has_resume=has_resume,
+        source_roadmap_id=source_roadmap_id
+    )
+    db.add(db_roadmap)
+    await db.flush()
+    db.add_all(RoadmapTopic(**row) for row in topic_rows(db_roadmap.id, content))
+    await db.commit()
+    await db.refresh(db_roadmap)
+    if not has_resume and source_roadmap_id is None:
+        roadmap_index.add(db_roadmap.id, goal, current_skills or "")
+    lesson_prefetcher.enqueue_roadmap(db_roadmap.title, content)
+    quiz_warmer.enqueue_roadmap(content)
+    return db_roadmap
+
+
+async def find_reusable_roadmap(db: AsyncSession, goal: str, current_skills: str = "", resume_text: str = ""):
+    """
+    A previously generated roadmap close enough to (goal, skills) to serve instead of
+    generating, or None. Requests with a resume are always generated.
+    """
+    if resume_text or not ROADMAP_REUSE_ENABLED:
+        return None
+    return await roadmap_index.find_similar(db, goal, current_skills or "")
+
+
+async def generate_or_reuse(db: AsyncSession, goal: str, current_skills: str = "", resume_text: str = ""):
+    """(roadmap content or an error dict, id of the reused roadmap or None)."""
+    source = await find_reusable_roadmap(db, goal, current_skills, resume_text)
+    if source is not None:
+        return source.content, source.id
+    return await agenerate_roadmap(goal, current_skills, resume_text), None
+
+
+async def backfill_topics(db: AsyncSession, roadmap_ids: list) -> dict:
+    """
+    Fills total_topics (and the roadmap_topics rows, where missing) for roadmaps
+    stored before either existed. Returns {roadmap_id: total_topics}.
+    """
+    indexed = set((await db.execute(
+        select(RoadmapTopic.roadmap_id).where(RoadmapTopic.roadmap_id.in_(roadmap_ids)).distinct()
+    )).scalars())
+    totals = {}
+    for roadmap in (await db.execute(select(Roadmap).where(Roadmap.id.in_(roadmap_ids)))).scalars():
+        roadmap.total_topics = count_topics(roadmap.content)
+        if roadmap.id not in indexed:
+            db.add_all(RoadmapTopic(**row) for row in topic_rows(roadmap.id, roadmap.content))
+        totals[roadmap.id] = roadmap.total_topics
+    await db.commit()
+    return totals
+
+
+async def run_roadmap_job(db: AsyncSession, user_id: int, params: dict) -> dict:
+    """Job handler for queued roadmap generation (see services/job_queue.py)."""
+    goal, current_skills, resume_text = params["goal"], params.get("current_skills", ""), params.get("resume_text", "")
+    ai_result, source_id = await generate_or_reuse(db, goal, current_skills, resume_text)
+    if "error" in ai_result:
+        raise JobFailed(f"{ai_result['error']}: {ai_result.get('details', '')}")
+    db_roadmap = await save_roadmap(
+        db, user_id, goal, ai_result,
+        current_skills=current_skills, has_resume=bool(resume_text), source_roadmap_id=source_id
+    )
+    return {"roadmap_id": db_roadmap.id}
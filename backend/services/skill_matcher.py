@@ -0,0 +1,129 @@
+from collections import deque
+from core.text import normalize_topic
+
+# Spellings GitHub (languages, repo topics) and the roadmaps use for the same skill.
+# Keys and values are in normalize_topic() form.
+ALIASES = {
+    "js": "javascript",
+    "ecmascript": "javascript",
+    "es6": "javascript",
+    "ts": "typescript",
+    "py": "python",
+    "python3": "python",
+    "reactjs": "react",
+    "react.js": "react",
+    "nextjs": "next.js",
+    "node": "node.js",
+    "nodejs": "node.js",
+    "vuejs": "vue",
+    "vue.js": "vue",
+    "angularjs": "angular",
+    "golang": "go",
+    "postgres": "postgresql",
+    "mongo": "mongodb",
+    "k8s": "kubernetes",
+    "dockerfile": "docker",
+    "cpp": "c++",
+    "csharp": "c#",
+    "html5": "html",
+    "css3": "css",
+    "ml": "machine learning",
+    "sklearn": "scikit learn",
+}
+
+ALIAS_GROUPS = {}
+for _alias, _canonical in ALIASES.items():
+    ALIAS_GROUPS.setdefault(_canonical, set()).add(_alias)
+
+
+def canonical_skill(term: str) -> str:
+    return ALIASES.get(term, term)
+
+
+class _Automaton:
+    """Aho-Corasick automaton: finds every pattern occurrence in one left-to-right pass."""
+
+    def __init__(self, patterns: dict):
+        # patterns: text -> value reported on a match
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for pattern, value in patterns.items():
+            state = 0
+            for ch in pattern:
+                if ch not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][ch] = len(self.goto) - 1
+                state = self.goto[state][ch]
+            self.output[state].append((len(pattern), value))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def search(self, text: str):
+        """Yields (start, end, value) for every occurrence."""
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for length, value in self.output[state]:
+                yield i - length + 1, i + 1, value
+
+
+def _leading_phrases(term: str):
+    """Leading word runs of `term`: "python web frameworks" -> "python", "python web", "python web frameworks"."""
+    words = term.split()
+    return {" ".join(words[:j]) for j in range(1, len(words) + 1)}
+
+
+class SkillMatcher:
+    """
+    Matches roadmap topic titles against a user's detected skills.
+
+    A topic matches when a skill (or one of its aliases) appears in it as whole
+    words ("React Hooks" <- "react", "JS Basics" <- "javascript"), or when the
+    whole topic leads a multi-word skill ("Python" <- "python frameworks").
+    Built once per skill set; each title is then checked in a single pass.
+    """
+
+    def __init__(self, skills):
+        patterns = {}
+        self._phrases = {}
+        for skill in skills:
+            term = normalize_topic(skill)
+            if not term:
+                continue
+            canonical = canonical_skill(term)
+            for pattern in {term, canonical} | ALIAS_GROUPS.get(canonical, set()):
+                patterns[pattern] = canonical
+            for phrase in _leading_phrases(term):
+                self._phrases.setdefault(canonical_skill(phrase), canonical)
+        self._automaton = _Automaton(patterns)
+
+    def match(self, title: str) -> set:
+        """Canonical skills found in `title`."""
+        text = normalize_topic(title)
+        if not text:
+            return set()
+        found = {
+            skill for start, end, skill in self._automaton.search(text)
+            if (start == 0 or text[start - 1] == " ") and (end == len(text) or text[end] == " ")
+        }
+        whole = self._phrases.get(canonical_skill(text))
+        if whole:
+            found.add(whole)
+        return found
+
+    def matches(self, title: str) -> bool:
+        return bool(self.match(title))
@@ -0,0 +1,166 @@
+import ast
+import datetime
+import hashlib
+import json
+import os
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import VerificationCacheEntry
+from core.cache import TTLCache
+from services.ai_service import CODE_REVIEW_PROMPT
+
+# Content-addressed cache of /challenges/verify outcomes.
+# Hot tier: in-process LRU. Backing tier: the `verification_cache` table, pruned to
+# VERIFY_CACHE_MAX_ROWS (least recently used first).
+VERIFY_CACHE_SIZE = int(os.getenv("VERIFY_CACHE_SIZE", "2048"))
+VERIFY_CACHE_TTL = float(os.getenv("VERIFY_CACHE_TTL", "3600"))
+VERIFY_CACHE_MAX_ROWS = int(os.getenv("VERIFY_CACHE_MAX_ROWS", "50000"))
+VERIFY_CACHE_PRUNE_EVERY = int(os.getenv("VERIFY_CACHE_PRUNE_EVERY", "200"))
+
+# Changes with the review prompt's pinned version or model, so old verdicts are not reused
+LLM_GRADER_VERSION = f"llm:{CODE_REVIEW_PROMPT.model}:v{CODE_REVIEW_PROMPT.version}"
+
+_hot_cache = TTLCache(maxsize=VERIFY_CACHE_SIZE, ttl=VERIFY_CACHE_TTL)
+_stores_since_prune = 0
+
+
+class _StripDocstrings(ast.NodeTransformer):
+    def _strip(self, node):
+        self.generic_visit(node)
+        body = node.body
+        if body and isinstance(body[0], ast.Expr) and isinstance(getattr(body[0], "value", None), ast.Constant) \
+                and isinstance(body[0].value.value, str):
+            node.body = body[1:] or [ast.Pass()]
+        return node
+
+    visit_Module = visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _strip
+
+
+def _strip_c_style(code: str) -> str:
+    """
+    Drops // and /* */ comments and collapses whitespace outside string literals.
+    Works for JavaScript and similar languages; string contents are left untouched.
+    """
+    out = []
+    i, n = 0, len(code)
+    pending_space = False
+    while i < n:
+        ch = code[i]
+        if ch in "\"'`":
+            quote = ch
+            j = i + 1
+            while j < n and code[j] != quote:
+                j += 2 if code[j] == "\\" else 1
+            if pending_space and out:
+                out.append(" ")
+            pending_space = False
+            out.append(code[i:j + 1])
+            i = j + 1
+        elif code.startswith("//", i):
+            end = code.find("\n", i)
+            i = n if end == -1 else end
+            pending_space = True
+        elif code.startswith("/*", i):
+            end = code.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            pending_space = True
+        elif ch.isspace():
+            pending_space = True
+            i += 1
+        else:
+            if pending_space and out:
+                out.append(" ")
+            pending_space = False
+            out.append(ch)
+            i += 1
+    return "".join(out)
+
+
+def normalize_code(language: str, code: str) -> str:
+    """
+    Canonical form of a submission, so formatting/comment-only differences share a cache entry.
+    Python uses the AST (comments, whitespace and docstrings vanish); everything else is
+    stripped of comments and redundant whitespace.
+    """
+    if language == "python":
+        try:
+            return ast.dump(_StripDocstrings().visit(ast.parse(code)))
+        except (SyntaxError, ValueError, RecursionError):
+            pass
+    return _strip_c_style(code)
+
+
+def grader_id(challenge: dict, language: str) -> str:
+    """Identifies what produced a verdict; part of the key so changing tests or prompts invalidates entries."""
+    if language == "python" and challenge.get("test_cases"):
+        spec = json.dumps([challenge["function_name"], challenge.get("compare", "exact"), challenge["test_cases"]], sort_keys=True)
+        return "tests:" + hashlib.sha256(spec.encode()).hexdigest()[:16]
+    return LLM_GRADER_VERSION
+
+
+def make_key(challenge: dict, language: str, code: str) -> str:
+    raw = "\x00".join([challenge["id"], language, grader_id(challenge, language), normalize_code(language, code)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+async def lookup(db: AsyncSession, cache_key: str):
+    """Returns {"is_correct", "feedback", "test_results"} for a known submission, or None."""
+    cached = _hot_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    entry = (await db.execute(
+        select(VerificationCacheEntry).where(VerificationCacheEntry.cache_key == cache_key)
+    )).scalar_one_or_none()
+    if entry is None:
+        return None
+
+    entry.hits = (entry.hits or 0) + 1
+    entry.last_used_at = datetime.datetime.utcnow()
+    await db.commit()
+
+    cached = {"is_correct": entry.is_correct, "feedback": entry.feedback, "test_results": entry.test_results or []}
+    _hot_cache.set(cache_key, cached)
+    return cached
+
+
+async def store(db: AsyncSession, cache_key: str, challenge_id: str, language: str, is_correct: bool, feedback: str, test_results: list):
+    global _stores_since_prune
+    cached = {"is_correct": is_correct, "feedback": feedback, "test_results": test_results}
+    _hot_cache.set(cache_key, cached)
+
+    try:
+        db.add(VerificationCacheEntry(
+            cache_key=cache_key,
+            challenge_id=challenge_id,
+            language=language,
+            is_correct=is_correct,
+            feedback=feedback,
+            test_results=test_results,
+            hits=0
+        ))
+        await db.commit()
+    except Exception as e:
+        # Most likely a concurrent insert of the same key; the verdict is identical, so ignore it
+        await db.rollback()
+        print(f"Verification cache store skipped: {e}")
+        return
+
+    _stores_since_prune += 1
+    if _stores_since_prune >= VERIFY_CACHE_PRUNE_EVERY:
+        _stores_since_prune = 0
+        await prune(db)
+
+
+async def prune(db: AsyncSession, max_rows: int = VERIFY_CACHE_MAX_ROWS):
+    """Evicts the least recently used rows beyond `max_rows`."""
+    cutoff = (await db.execute(
+        select(VerificationCacheEntry.last_used_at)
+        .order_by(VerificationCacheEntry.last_used_at.desc())
+        .offset(max_rows)
+        .limit(1)
+    )).scalar_one_or_none()
+    if cutoff is None:
+        return
+    await db.execute(delete(VerificationCacheEntry).where(VerificationCacheEntry.last_used_at <= cutoff))
+    await db.commit()
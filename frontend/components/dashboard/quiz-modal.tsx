@@ -6,6 +6,7 @@ import { Button } from "@/components/ui/button"
 import { RadioGroup, RadioGroupItem } from "@/components/ui/radio-group"
 import { Label } from "@/components/ui/label"
 import { CheckCircle2, XCircle, ChevronRight, RotateCcw, Loader2 } from "lucide-react"
+import { createClient } from "@/utils/supabase/client"
 
 type QuizOption = {
     text: string
@@ -50,8 +51,16 @@ export function QuizModal({ isOpen, onClose, topic }: QuizModalProps) {
         setQuizData(null)
 
         try {
+            const supabase = createClient()
+            const { data: { session } } = await supabase.auth.getSession()
+            const token = session?.access_token
+
             const apiUrl = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000"
-            const response = await fetch(`${apiUrl}/api/v1/learning/quiz?topic=${encodeURIComponent(topic)}`)
+            const response = await fetch(`${apiUrl}/api/v1/learning/quiz?topic=${encodeURIComponent(topic)}`, {
+                headers: {
+                    Authorization: `Bearer ${token}`
+                }
+            })
             if (!response.ok) throw new Error("Failed to load quiz")
             const data = await response.json()
             setQuizData(data)